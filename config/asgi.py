@@ -5,6 +5,11 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+
+読み取り専用の非同期エンドポイント（/api/async/）用。書き込みを含む
+同期の DRF ビューは従来どおり WSGI（gunicorn config.wsgi）で動かす。
+
+    uvicorn config.asgi:application --port 8001
 """
 
 import os
@@ -12,5 +17,15 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# 永続接続は ASGI では使い回されないので無効にする（必要なら pgbouncer 等でプールする）
+os.environ.setdefault('DJANGO_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
+
+# URL の解決表とシリアライザーを先に作っておく（接続は CONN_MAX_AGE=0 で使い回されないので張らない）
+from django.conf import settings  # noqa: E402
+
+if settings.WARMUP:
+    from mitaina.warmup import warm_up  # noqa: E402
+
+    warm_up(code=True, database=False)
@@ -0,0 +1,31 @@
+"""
+gunicorn の設定（Procfile の `gunicorn config.wsgi` がカレントディレクトリから自動で読む）
+
+preload_app でアプリ（Django の設定・URL・ビュー）をマスターで1回だけ読み込み、
+DB を使わないウォームアップもマスターで済ませてから fork する。
+DB 接続はワーカーごとに post_fork で張る（mitaina/warmup.py を参照）。
+
+WARMUP=0 で無効、WARMUP_QUERIES=1 で代表的なクエリも流す。
+"""
+preload_app = True
+
+
+def when_ready(server):
+    from django.conf import settings
+
+    if settings.WARMUP:
+        from mitaina.warmup import format_timings, warm_up
+
+        # マスターでは DB に接続しない（接続を fork したワーカーと共有してしまうため）
+        timings = warm_up(code=True, database=False)
+        server.log.info("warm-up (master): %s", format_timings(timings))
+
+
+def post_fork(server, worker):
+    from django.conf import settings
+
+    if settings.WARMUP:
+        from mitaina.warmup import format_timings, warm_up
+
+        timings = warm_up(code=False, database=True, queries=settings.WARMUP_QUERIES)
+        server.log.info("warm-up (worker %s): %s", worker.pid, format_timings(timings))
@@ -1,49 +1,114 @@
 from django.contrib import admin
-from .models import User, Post, Reaction, Follow, Notification, Report
+from .models import User, Post, Reaction, ReactionSet, Follow, Notification, Report, Job, OutboundEmail
+from .pagination import EstimatedCountPaginator
+
+# 検索は "^"（前方一致）のみ。UPPER(col) text_pattern_ops のインデックスで引ける
+# （icontains は巨大テーブルで全件スキャンになるため使わない）
+
+
+class EstimatedCountAdmin(admin.ModelAdmin):
+    """
+    巨大テーブル用: 検索・絞り込みのない changelist だけ COUNT(*) の代わりに推定件数を使う
+
+    検索・絞り込みがあると推定がずれて、ページ数が実際と合わなくなるため
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        # p（ページ）と o（並び順）以外のパラメータは検索・絞り込み
+        unfiltered = not (set(request.GET) - {"p", "o"})
+        return self.paginator(queryset, per_page, orphans, allow_empty_first_page, estimate=unfiltered)
 
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
     list_display = ("id", "username", "handle_name", "email", "date_joined")
-    search_fields = ("username", "handle_name", "email")
+    search_fields = ("^username", "^handle_name", "^email")
     list_filter = ("date_joined",)
 
 
 @admin.register(Post)
-class PostAdmin(admin.ModelAdmin):
-    list_display = ("id", "author", "text", "genre", "character_name", "like_count", "hatena_count", "correct_count", "created_at", "deleted_at")
-    search_fields = ("text", "author__handle_name", "work_title", "performer_name", "character_name")
-    list_filter = ("genre", "created_at", "deleted_at")
+class PostAdmin(EstimatedCountAdmin):
+    list_display = ("id", "author", "text", "genre", "character_name", "like_count", "hatena_count", "correct_count", "report_count", "created_at", "deleted_at", "hidden_at")
+    list_select_related = ("author",)
+    search_fields = ("^text", "^work_title", "^performer_name", "^character_name", "^author__username")
+    list_filter = ("genre", "created_at", "deleted_at", "hidden_at")
+    autocomplete_fields = ("author",)
     readonly_fields = ("created_at",)
+    ordering = ("-id",)
 
 
 @admin.register(Reaction)
-class ReactionAdmin(admin.ModelAdmin):
+class ReactionAdmin(EstimatedCountAdmin):
     list_display = ("id", "user", "post", "reaction_type", "created_at")
-    search_fields = ("user__handle_name", "post__text")
+    # Post.__str__ が author を参照するので post__author まで結合する
+    list_select_related = ("user", "post__author")
+    search_fields = ("^user__username", "^post__text")
     list_filter = ("reaction_type", "created_at")
+    autocomplete_fields = ("user",)
+    raw_id_fields = ("post",)
     readonly_fields = ("created_at",)
+    ordering = ("-id",)
+
+
+@admin.register(ReactionSet)
+class ReactionSetAdmin(EstimatedCountAdmin):
+    list_display = ("id", "user", "post", "mask", "like_at", "hatena_at", "correct_at", "collect_at")
+    list_select_related = ("user", "post__author")
+    search_fields = ("^user__username",)
+    autocomplete_fields = ("user",)
+    raw_id_fields = ("post",)
+    ordering = ("-id",)
 
 
 @admin.register(Follow)
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(EstimatedCountAdmin):
     list_display = ("id", "follower", "following", "created_at")
-    search_fields = ("follower__handle_name", "following__handle_name")
+    list_select_related = ("follower", "following")
+    search_fields = ("^follower__username", "^following__username")
     list_filter = ("created_at",)
+    autocomplete_fields = ("follower", "following")
     readonly_fields = ("created_at",)
+    ordering = ("-id",)
 
 
 @admin.register(Notification)
-class NotificationAdmin(admin.ModelAdmin):
+class NotificationAdmin(EstimatedCountAdmin):
     list_display = ("id", "user", "actor", "notification_type", "is_read", "created_at")
-    search_fields = ("user__handle_name", "actor__handle_name")
+    list_select_related = ("user", "actor")
+    search_fields = ("^user__username", "^actor__username")
     list_filter = ("notification_type", "is_read", "created_at")
+    autocomplete_fields = ("user", "actor")
+    raw_id_fields = ("post",)
     readonly_fields = ("created_at",)
+    ordering = ("-id",)
 
 
 @admin.register(Report)
-class ReportAdmin(admin.ModelAdmin):
+class ReportAdmin(EstimatedCountAdmin):
     list_display = ("id", "reporter", "post", "reason", "created_at")
-    search_fields = ("reporter__handle_name", "post__text")
+    list_select_related = ("reporter", "post__author")
+    search_fields = ("^reporter__username", "^post__text")
     list_filter = ("reason", "created_at")
+    autocomplete_fields = ("reporter",)
+    raw_id_fields = ("post",)
+    readonly_fields = ("created_at",)
+    ordering = ("-id",)
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "name", "status", "attempts", "run_at", "created_at")
+    list_filter = ("status", "name")
+    readonly_fields = ("created_at",)
+    ordering = ("-id",)
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ("id", "from_email", "recipients", "status", "attempts", "run_at", "created_at")
+    list_filter = ("status",)
+    exclude = ("message",)
     readonly_fields = ("created_at",)
+    ordering = ("-id",)
@@ -0,0 +1,102 @@
+"""
+重い読み取りの流量制御（admission control）と statement_timeout
+
+?search=（3カラムの icontains）、?ordering=-like_count のような全件ソート、
+深いページ番号（大きな OFFSET）は数本同時に走るだけで DB を使い切り、
+react のような軽いリクエストまで遅くする。そこでリクエストをコストのクラスに分け、
+
+- クラスごと・ルート（basename.action）ごとに同時実行数を ADMISSION_CLASSES の
+  limit までに抑える。空きがなければ待たずに 503 と Retry-After を返す
+- クエリには SET LOCAL statement_timeout をかけ、超えたら同じく 503 を返す
+
+同時実行数はキャッシュの add で取るスロット（limit 個）で数える。ワーカーが
+落ちて返されなかったスロットも ADMISSION_SLOT_SECONDS 秒で空く。スロットには
+リクエストごとのトークンを入れ、返すときは自分のトークンのままのときだけ消す
+（期限切れ後に他のリクエストが取ったスロットを消さない）。キャッシュが
+LocMem（REDIS_URL なし）の場合はプロセス内のみ。
+"""
+import random
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import OperationalError, connections, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+# PostgreSQL の query_canceled（statement_timeout を超えた）
+QUERY_CANCELED = "57014"
+
+
+class Overloaded(APIException):
+    """重いリクエストの枠が埋まっている・時間切れ（Retry-After つきの 503）"""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "The server is busy with expensive requests. Retry later."
+    default_code = "overloaded"
+
+    def __init__(self, wait=None, detail=None, code=None):
+        super().__init__(detail, code)
+        self.wait = wait if wait is not None else settings.ADMISSION_RETRY_AFTER
+
+
+def _acquire(route, cost_class, limit):
+    """空いているスロットを取って (キー, トークン) を返す（なければ None）"""
+    token = uuid.uuid4().hex
+    # 先頭のスロットに取り合いが集中しないよう開始位置をずらす
+    start = random.randrange(limit)
+    for i in range(limit):
+        key = f"admission:{route}:{cost_class}:{(start + i) % limit}"
+        if cache.add(key, token, settings.ADMISSION_SLOT_SECONDS):
+            return key, token
+    return None
+
+
+def _release(slot):
+    """自分のトークンが残っているときだけスロットを返す"""
+    key, token = slot
+    if cache.get(key) == token:
+        cache.delete(key)
+
+
+@contextmanager
+def statement_timeout(milliseconds, using):
+    """ブロック内のクエリに statement_timeout をかける（PostgreSQL のみ。トランザクションで囲む）"""
+    connection = connections[using]
+    if not milliseconds or connection.vendor != "postgresql":
+        yield
+        return
+    with transaction.atomic(using=using):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL statement_timeout = %s", [int(milliseconds)])
+        yield
+
+
+@contextmanager
+def admit(route, cost_class, using):
+    """
+    cost_class のスロットを取ってブロックを実行する
+
+    ADMISSION_CLASSES にないクラス（None を含む）はそのまま実行する。
+    枠が埋まっている・statement_timeout を超えた場合は Overloaded
+    """
+    config = settings.ADMISSION_CLASSES.get(cost_class) if settings.ADMISSION_CONTROL else None
+    if config is None:
+        yield
+        return
+
+    slot = None
+    if config.get("limit"):
+        slot = _acquire(route, cost_class, config["limit"])
+        if slot is None:
+            raise Overloaded()
+    try:
+        with statement_timeout(config.get("statement_timeout_ms"), using):
+            yield
+    except OperationalError as exc:
+        if getattr(exc.__cause__, "pgcode", None) != QUERY_CANCELED:
+            raise
+        raise Overloaded() from exc
+    finally:
+        if slot is not None:
+            _release(slot)
@@ -0,0 +1,194 @@
+"""
+読み取り専用の非同期 API ビュー（ASGI 用）
+
+遅いクライアントでワーカーを占有しないよう、負荷の高い読み取り
+（投稿一覧/詳細・フィード・ユーザー・通知）を async ORM で返す。
+書き込みは従来どおり DRF のビューセット（同期）を使う。
+
+レスポンスの形は同期版と同じ。シリアライザーは同期版のものを使い回すが、
+関連は select_related で読み込み済みにしてからシリアライズするので、
+シリアライズ中にクエリは発行されない。
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Count
+from django.http import HttpResponseNotAllowed, JsonResponse
+from rest_framework.authtoken.models import Token
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .db_router import activate_replica, deactivate_replica, is_pinned_to_primary
+from .follow_cache import following_ids
+from .impressions import record_views, viewer_key
+from .models import User, Post, Notification
+from .pagination import estimated_count
+from .serializers import UserPublicSerializer, PostSerializer, NotificationSerializer
+from .snowflake import default_ordering
+
+POST_ORDERING_FIELDS = ("created_at", "like_count", "hatena_count", "correct_count")
+
+
+def _json(data, status=200):
+    # 日時などは DRF と同じ形式で出す
+    return JsonResponse(
+        data,
+        status=status,
+        encoder=JSONEncoder,
+        safe=False,
+        json_dumps_params={"ensure_ascii": False},
+    )
+
+
+async def _authenticate(request):
+    """Authorization: Token <key> からユーザーを取得（なければ None）"""
+    header = request.headers.get("Authorization", "")
+    keyword, _, key = header.partition(" ")
+    if keyword.lower() != "token" or not key.strip():
+        return None
+    try:
+        token = await Token.objects.select_related("user").aget(key=key.strip())
+    except Token.DoesNotExist:
+        return None
+    return token.user if token.user.is_active else None
+
+
+def api_view(login_required=False):
+    """認証とレプリカへの読み取りルーティングを行うデコレーター"""
+    def decorator(view):
+        # django.views.decorators.http は 4.2 では async ビューに使えないので自前で判定
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return HttpResponseNotAllowed(["GET", "HEAD"])
+            user = await _authenticate(request)
+            if login_required and user is None:
+                return _json({"detail": "認証情報が含まれていません。"}, status=401)
+
+            # 書き込み直後のユーザーは primary から読む（同期版の ReplicaReadMixin と同じ）
+            pinned = user is not None and await sync_to_async(is_pinned_to_primary)(user.pk)
+            token = None if pinned else activate_replica()
+            try:
+                return await view(request, user, *args, **kwargs)
+            finally:
+                if token is not None:
+                    deactivate_replica(token)
+
+        return wrapper
+    return decorator
+
+
+def _page_number(request):
+    try:
+        return max(int(request.GET.get("page", 1)), 1)
+    except ValueError:
+        return 1
+
+
+async def _paginate(request, queryset, serializer_class, viewer=None, estimate=False):
+    """
+    PageNumberPagination と同じ形 {count, next, previous, results} で返す
+
+    viewer を渡すとページ内の投稿の閲覧（インプレッション）を記録する。
+    estimate は絞り込みのない一覧のときだけ True にする（件数を推定する）
+    """
+    page_size = settings.REST_FRAMEWORK["PAGE_SIZE"]
+    page = _page_number(request)
+    offset = (page - 1) * page_size
+
+    count = await sync_to_async(estimated_count)(queryset, estimate=estimate)
+    objects = [obj async for obj in queryset[offset : offset + page_size]]
+    if viewer is not None:
+        record_views([obj.pk for obj in objects], viewer)
+
+    url = request.build_absolute_uri()
+    next_url = replace_query_param(url, "page", page + 1) if offset + page_size < count else None
+    if page <= 1:
+        previous_url = None
+    elif page == 2:
+        previous_url = remove_query_param(url, "page")
+    else:
+        previous_url = replace_query_param(url, "page", page - 1)
+
+    return _json({
+        "count": count,
+        "next": next_url,
+        "previous": previous_url,
+        "results": serializer_class(objects, many=True).data,
+    })
+
+
+def _live_posts():
+    return Post.objects.filter(deleted_at__isnull=True, hidden_at__isnull=True).select_related("author")
+
+
+@api_view()
+async def post_list(request, user):
+    """投稿一覧（?genre= と ?ordering= に対応。全文検索は同期版の ?search= を使う）"""
+    posts = _live_posts()
+    genre = request.GET.get("genre")
+    if genre:
+        posts = posts.filter(genre=genre)
+
+    ordering = request.GET.get("ordering", default_ordering())
+    if ordering.lstrip("-") not in POST_ORDERING_FIELDS:
+        ordering = default_ordering()
+    return await _paginate(
+        request,
+        posts.order_by(ordering),
+        PostSerializer,
+        viewer=viewer_key(request, user),
+        estimate=not genre,
+    )
+
+
+@api_view()
+async def post_detail(request, user, pk):
+    """投稿詳細"""
+    try:
+        post = await _live_posts().aget(pk=pk)
+    except Post.DoesNotExist:
+        return _json({"detail": "見つかりませんでした。"}, status=404)
+    record_views([post.pk], viewer_key(request, user))
+    return _json(PostSerializer(post).data)
+
+
+@api_view(login_required=True)
+async def feed(request, user):
+    """フィード（フォロー中のユーザーの投稿）"""
+    following = await sync_to_async(following_ids)(user.pk)
+    if not following:
+        posts = Post.objects.none()
+    else:
+        posts = _live_posts().filter(author_id__in=list(following)).order_by(default_ordering())
+    return await _paginate(request, posts, PostSerializer, viewer=viewer_key(request, user))
+
+
+@api_view()
+async def user_detail(request, user, username):
+    """ユーザー情報（フォロー/フォロワー数と is_followed つき）"""
+    users = User.objects.filter(is_active=True).select_related("stats").annotate(
+        following_count=Count("following_list", distinct=True),
+        followers_count=Count("followers_list", distinct=True),
+    )
+    try:
+        target = await users.aget(username=username)
+    except User.DoesNotExist:
+        return _json({"detail": "見つかりませんでした。"}, status=404)
+
+    context = {}
+    if user is not None:
+        context["following_ids"] = await sync_to_async(following_ids)(user.pk)
+    return _json(UserPublicSerializer(target, context=context).data)
+
+
+@api_view(login_required=True)
+async def notification_list(request, user):
+    """自分への通知一覧"""
+    notifications = (
+        Notification.objects.filter(user=user)
+        .select_related("actor", "post", "post__author")
+        .order_by("-created_at")
+    )
+    return await _paginate(request, notifications, NotificationSerializer)
@@ -0,0 +1,119 @@
+"""
+読み取り結果のキャッシュとリクエストの合流（single-flight / stale-while-revalidate）
+
+人気の投稿などで同じキーのキャッシュが同時に切れると、全員が同じクエリと
+シリアライズを並行して実行して DB に負荷が集中する。これを防ぐため:
+
+- 同じプロセス内: 最初の1スレッドだけが計算し、他は結果を待って使い回す
+- ワーカー間: キャッシュの add をロックにして1ワーカーだけが計算し、
+  他のワーカーは結果がキャッシュに入るのを待つ（待ちきれなければ自分で計算する）
+- 期限切れ（stale）の値があるときは、計算中の1人以外はそれを返して待たない
+
+値は {"value": ..., "fresh_until": 時刻} としてキャッシュに
+ttl + stale_ttl 秒置く。キャッシュが LocMem（REDIS_URL なし）の場合はプロセス内のみ。
+"""
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+_flights_lock = threading.Lock()
+_flights = {}  # key -> _Flight（このプロセスで計算中のもの）
+
+
+class _Flight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.ok = False
+        self.value = None
+
+
+def _store(key, value, ttl, stale_ttl):
+    cache.set(key, {"value": value, "fresh_until": time.time() + ttl}, ttl + stale_ttl)
+
+
+def _compute_across_workers(key, stale, compute, ttl, stale_ttl, cacheable):
+    """ワーカー間のロックを取れたら計算、取れなければ他のワーカーの結果を待つ"""
+    lock_key = f"{key}:lock"
+    lock_seconds = settings.READ_CACHE_LOCK_SECONDS
+    if cache.add(lock_key, 1, lock_seconds):
+        try:
+            value = compute()
+            if cacheable(value):
+                _store(key, value, ttl, stale_ttl)
+            return value
+        finally:
+            cache.delete(lock_key)
+
+    if stale is not None:
+        return stale["value"]
+
+    deadline = time.monotonic() + lock_seconds
+    delay = 0.005
+    while time.monotonic() < deadline:
+        time.sleep(delay)
+        delay = min(delay * 2, 0.1)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry["value"]
+    # 計算中のワーカーが落ちた・遅すぎる場合は自分で計算する
+    return compute()
+
+
+def get_or_compute(key, compute, ttl=None, stale_ttl=None, cacheable=lambda value: True):
+    """
+    キャッシュの値を返す。なければ（期限切れなら）合流して1回だけ compute() する
+
+    Args:
+        cacheable: compute() の結果をキャッシュに置くか（エラー応答などを除く）
+    """
+    ttl = settings.READ_CACHE_SECONDS if ttl is None else ttl
+    stale_ttl = settings.READ_CACHE_STALE_SECONDS if stale_ttl is None else stale_ttl
+
+    entry = cache.get(key)
+    if entry is not None and entry["fresh_until"] > time.time():
+        return entry["value"]
+
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        if entry is not None:
+            return entry["value"]
+        flight.event.wait(settings.READ_CACHE_LOCK_SECONDS)
+        if flight.ok:
+            return flight.value
+        # 計算していたスレッドが失敗した・遅すぎる場合は自分で計算する
+        return compute()
+
+    try:
+        flight.value = _compute_across_workers(key, entry, compute, ttl, stale_ttl, cacheable)
+        flight.ok = True
+        return flight.value
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight.event.set()
+
+
+def _version_key(name):
+    return f"coalesce:version:{name}"
+
+
+def version(name):
+    """name（例: "post:123"）のキャッシュのバージョン。キーに含めて invalidate で切り替える"""
+    return cache.get(_version_key(name)) or "0"
+
+
+def invalidate(*names):
+    """names のキャッシュを無効にする（トランザクション内ならコミット後に反映）"""
+    if names:
+        transaction.on_commit(
+            lambda: cache.set_many({_version_key(name): uuid.uuid4().hex[:8] for name in names}, None)
+        )
@@ -0,0 +1,74 @@
+"""リードレプリカへの読み取りルーティング"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+# 現在のリクエストで読み取りに使う DB エイリアス（None なら primary）
+_read_alias = ContextVar("mitaina_read_alias", default=None)
+
+
+def _sticky_key(user_id):
+    return f"db:sticky:{user_id}"
+
+
+def choose_replica():
+    """レプリカを1つ選ぶ（未設定なら None）"""
+    replicas = getattr(settings, "REPLICA_DATABASES", [])
+    if not replicas:
+        return None
+    return random.choice(replicas)
+
+
+def current_read_alias():
+    """現在の読み取り先 DB エイリアス"""
+    return _read_alias.get() or "default"
+
+
+@contextmanager
+def use_replica(alias=None):
+    """ブロック内の読み取りをレプリカへ向ける"""
+    token = _read_alias.set(alias or choose_replica())
+    try:
+        yield current_read_alias()
+    finally:
+        _read_alias.reset(token)
+
+
+def activate_replica(alias=None):
+    """読み取りをレプリカへ向ける（戻り値は deactivate 用のトークン）"""
+    return _read_alias.set(alias or choose_replica())
+
+
+def deactivate_replica(token):
+    """activate_replica の設定を元に戻す"""
+    _read_alias.reset(token)
+
+
+def pin_to_primary(user_id):
+    """書き込み直後のユーザーをしばらく primary に固定する"""
+    cache.set(_sticky_key(user_id), 1, settings.REPLICA_STICKY_SECONDS)
+
+
+def is_pinned_to_primary(user_id):
+    """primary 固定中か"""
+    return cache.get(_sticky_key(user_id)) is not None
+
+
+class PrimaryReplicaRouter:
+    """書き込みは常に primary、読み取りはリクエスト単位でレプリカへ"""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get() or "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # レプリカは primary の複製なので同一DB扱い
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
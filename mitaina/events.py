@@ -0,0 +1,89 @@
+"""変更イベントログ（トランザクショナル・アウトボックス）"""
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Event, EventCheckpoint
+
+EVENT_KINDS = (
+    "post.created",
+    "post.deleted",
+    "reaction.added",
+    "reaction.removed",
+    "follow.added",
+    "follow.removed",
+    "user.deletion_requested",
+)
+
+
+def record_event(kind, **payload):
+    """
+    イベントを記録する
+
+    呼び出し元の変更と同じトランザクション内で呼ぶこと（変更がロールバック
+    されればイベントも残らない）
+    """
+    if kind not in EVENT_KINDS:
+        raise ValueError(f"Invalid event kind: {kind}")
+    return Event.objects.create(
+        kind=kind,
+        payload=payload,
+        txid=RawSQL("txid_current()", ()),
+    )
+
+
+def _visible_txid_horizon():
+    """これより小さい txid のトランザクションはすべて完了している"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+        return cursor.fetchone()[0]
+
+
+def read_events(after_txid=0, after_id=0, limit=1000, kinds=None):
+    """
+    チェックポイント (after_txid, after_id) より後のイベントを返す
+
+    ID は採番順でコミット順ではないため、ID だけで読み進めると後から
+    コミットされた小さい ID を取りこぼす。完了済みトランザクションの
+    イベントだけを (txid, id) 順に読むことで、取りこぼしなく読み進められる
+    """
+    horizon = _visible_txid_horizon()
+    qs = Event.objects.filter(
+        Q(txid__gt=after_txid) | Q(txid=after_txid, id__gt=after_id),
+        txid__lt=horizon,
+    )
+    if kinds:
+        qs = qs.filter(kind__in=kinds)
+    return list(qs.order_by("txid", "id")[:limit])
+
+
+def consume(name, handler, batch_size=1000, max_batches=None, kinds=None):
+    """
+    コンシューマ name のチェックポイントからイベントをバッチで読み、handler(events) に渡す
+
+    handler の処理とチェックポイントの更新は同じトランザクションで行うので、
+    DB 上の派生データは途中で落ちても二重適用されない
+
+    Returns:
+        int: 処理したイベント数
+    """
+    total = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            checkpoint, _ = EventCheckpoint.objects.select_for_update().get_or_create(name=name)
+            events = read_events(
+                checkpoint.last_txid,
+                checkpoint.last_event_id,
+                limit=batch_size,
+                kinds=kinds,
+            )
+            if not events:
+                break
+            handler(events)
+            checkpoint.last_txid = events[-1].txid
+            checkpoint.last_event_id = events[-1].id
+            checkpoint.save(update_fields=["last_txid", "last_event_id", "updated_at"])
+        total += len(events)
+        batches += 1
+    return total
@@ -0,0 +1,146 @@
+"""一括エクスポート（NDJSON / CSV のストリーミング出力）"""
+import csv
+import io
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+
+from .db_router import choose_replica
+from .models import Post, Reaction, ReactionSet
+from .reactions import bitmask_enabled, expand_reaction_sets, reaction_set_since
+
+EXPORT_KINDS = ("posts", "reactions")
+EXPORT_FORMATS = ("ndjson", "csv")
+
+# 1チャンクあたりの出力サイズの目安（細かい write を避ける）
+BUFFER_SIZE = 64 * 1024
+
+
+def export_queryset(kind, since=None):
+    """エクスポート対象の values クエリセット（id 昇順）"""
+    if kind == "posts":
+        qs = Post.objects.values(
+            "id",
+            "author_id",
+            "text",
+            "genre",
+            "work_title",
+            "performer_name",
+            "character_name",
+            "like_count",
+            "hatena_count",
+            "correct_count",
+            "collect_count",
+            "created_at",
+            "deleted_at",
+            author_username=F("author__username"),
+        )
+    elif kind == "reactions" and bitmask_enabled():
+        # iter_export で Reaction と同じ形に展開する
+        qs = ReactionSet.objects.values(
+            "id", "user_id", "post_id", "mask", "like_at", "hatena_at", "correct_at", "collect_at"
+        )
+        if since is not None:
+            qs = qs.filter(reaction_set_since(since))
+        return qs.order_by("id")
+    elif kind == "reactions":
+        qs = Reaction.objects.values("id", "user_id", "post_id", "reaction_type", "created_at")
+    else:
+        raise ValueError(f"Invalid export kind: {kind}")
+
+    if since is not None:
+        qs = qs.filter(created_at__gte=since)
+    return qs.order_by("id")
+
+
+def _ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False, cls=DjangoJSONEncoder) + "\n"
+
+
+def _csv_lines(rows):
+    buffer = io.StringIO()
+    writer = None
+    for row in rows:
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=list(row.keys()))
+            writer.writeheader()
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _buffered(lines):
+    """行を BUFFER_SIZE 程度のバイト列にまとめる"""
+    parts, size = [], 0
+    for line in lines:
+        data = line.encode("utf-8")
+        parts.append(data)
+        size += len(data)
+        if size >= BUFFER_SIZE:
+            yield b"".join(parts)
+            parts, size = [], 0
+    if parts:
+        yield b"".join(parts)
+
+
+def _gzip_compressor():
+    return zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+def _gzipped(chunks):
+    compressor = _gzip_compressor()
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_export(kind, fmt="ndjson", since=None, compress=False, chunk_size=2000, using=None):
+    """
+    エクスポートをバイト列のチャンクのイテレータとして返す
+
+    サーバーサイドカーソル（iterator(chunk_size=...)）で読むため、
+    テーブルサイズに関係なくメモリ使用量は一定
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Invalid export format: {fmt}")
+
+    qs = export_queryset(kind, since=since).using(using or choose_replica() or "default")
+    rows = qs.iterator(chunk_size=chunk_size)
+    if kind == "reactions" and bitmask_enabled():
+        rows = expand_reaction_sets(rows, since=since)
+    lines = _ndjson_lines(rows) if fmt == "ndjson" else _csv_lines(rows)
+    chunks = _buffered(lines)
+    if compress:
+        chunks = _gzipped(chunks)
+    return chunks
+
+
+class NdjsonArchive:
+    """
+    行を gzip 圧縮した NDJSON としてファイルに追記していく（バッチ削除前の退避用）
+
+    write() ごとに圧縮ストリームを同期フラッシュするので、途中で止まっても
+    それまでに書いた行は読み出せる
+    """
+
+    def __init__(self, fileobj):
+        self._file = fileobj
+        self._compressor = _gzip_compressor()
+        self.rows = 0
+
+    def write(self, rows):
+        for chunk in _buffered(_ndjson_lines(rows)):
+            self._file.write(self._compressor.compress(chunk))
+        self._file.write(self._compressor.flush(zlib.Z_SYNC_FLUSH))
+        self._file.flush()
+        self.rows += len(rows)
+
+    def close(self):
+        self._file.write(self._compressor.flush())
+        self._file.flush()
@@ -0,0 +1,101 @@
+"""
+フォロー中ユーザー ID のプロセス内キャッシュ
+
+ユーザーごとのフォロー先 ID をソート済みの整数配列で持つ（LRU で件数上限あり）。
+ワーカー間の無効化は共有キャッシュ（Redis）上のバージョンで行い、参照のたびに
+バージョンだけを確認する。
+
+共有キャッシュがない（REDIS_URL なしの LocMem）場合は、フォロー・解除を処理した
+ワーカー以外が古い集合を返し続けるので、キャッシュせず毎回 DB から読む。
+"""
+import threading
+import time
+import uuid
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+from .models import Follow
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # user_id -> (version, loaded_at, FollowSet)
+
+
+def _version_key(user_id):
+    return f"follow:version:{user_id}"
+
+
+class FollowSet:
+    """フォロー先 ID の集合（ソート済み array なので set より省メモリ）"""
+    __slots__ = ("ids",)
+
+    def __init__(self, ids):
+        self.ids = array("q", sorted(ids))
+
+    def __contains__(self, user_id):
+        i = bisect_left(self.ids, user_id)
+        return i < len(self.ids) and self.ids[i] == user_id
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def _load(user_id):
+    # レプリカの遅延で古い集合をキャッシュしないよう primary から読む
+    return FollowSet(
+        Follow.objects.using("default")
+        .filter(follower_id=user_id)
+        .values_list("following_id", flat=True)
+    )
+
+
+def _enabled():
+    """無効化をワーカー間で共有できるときだけプロセス内にキャッシュする"""
+    return settings.FOLLOW_CACHE_SIZE > 0 and not isinstance(caches["default"], (LocMemCache, DummyCache))
+
+
+def following_ids(user_id):
+    """user_id がフォローしているユーザー ID の FollowSet"""
+    if not _enabled():
+        return _load(user_id)
+    version = cache.get(_version_key(user_id))
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(user_id)
+        if entry and entry[0] == version and now - entry[1] < settings.FOLLOW_CACHE_TTL:
+            _entries.move_to_end(user_id)
+            return entry[2]
+
+    # バージョンは読み込み前に取得済みなので、読み込み中に変更されても次回読み直される
+    follow_set = _load(user_id)
+    with _lock:
+        _entries[user_id] = (version, now, follow_set)
+        _entries.move_to_end(user_id)
+        while len(_entries) > settings.FOLLOW_CACHE_SIZE:
+            _entries.popitem(last=False)
+    return follow_set
+
+
+def is_following(user_id, target_id):
+    return target_id in following_ids(user_id)
+
+
+def invalidate(*user_ids):
+    """user_ids のフォロー先が変わった（トランザクション内ならコミット後に反映）"""
+    def bump():
+        cache.set_many({_version_key(user_id): uuid.uuid4().hex for user_id in user_ids}, None)
+        with _lock:
+            for user_id in user_ids:
+                _entries.pop(user_id, None)
+
+    if user_ids:
+        transaction.on_commit(bump)
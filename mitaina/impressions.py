@@ -0,0 +1,204 @@
+"""
+投稿の閲覧数（ユニーク閲覧者数の HyperLogLog 推定）
+
+閲覧ごとに行を書くと書き込みが読み取りの数だけ増えるので、
+- リクエストではプロセス内の投稿ごとのスケッチ（REGISTERS バイト）に畳み込むだけ
+- VIEW_FLUSH_SECONDS ごと / VIEW_BUFFER_MAX_POSTS 件たまるごとにまとめて DB の
+  PostViewSketch にマージし、推定値を Post.view_count に書く
+  （ASYNC_SIDE_EFFECTS が有効ならジョブキュー経由）
+
+スケッチは投稿あたり固定サイズで、標準誤差は約 1.04 / sqrt(REGISTERS)（3%程度）。
+同じ閲覧者は何度見ても 1 と数える
+"""
+import atexit
+import base64
+import hashlib
+import logging
+import math
+import threading
+import time
+import zlib
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from rest_framework.throttling import BaseThrottle
+
+from .jobs import enqueue, job_handler
+from .models import Post, PostViewSketch
+
+logger = logging.getLogger(__name__)
+
+PRECISION = 10
+REGISTERS = 1 << PRECISION
+_RANK_BITS = 64 - PRECISION
+_ALPHA = 0.7213 / (1 + 1.079 / REGISTERS)
+
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def register_of(key):
+    """閲覧者キーの (レジスタ番号, ランク)"""
+    h = _hash64(key)
+    rest = h & ((1 << _RANK_BITS) - 1)
+    return h >> _RANK_BITS, _RANK_BITS - rest.bit_length() + 1
+
+
+def merge(registers, other):
+    """registers に other を畳み込む（レジスタごとの最大値）"""
+    for i, rank in enumerate(other):
+        if rank > registers[i]:
+            registers[i] = rank
+    return registers
+
+
+def estimate(registers):
+    """ユニーク数の推定値（少ないうちは線形カウンティング）"""
+    z = sum(2.0 ** -rank for rank in registers)
+    value = _ALPHA * REGISTERS * REGISTERS / z
+    zeros = registers.count(0)
+    if value <= 2.5 * REGISTERS and zeros:
+        value = REGISTERS * math.log(REGISTERS / zeros)
+    return round(value)
+
+
+def viewer_key(request, user):
+    """閲覧者の識別子（ログイン中はユーザー、それ以外は throttle と同じ IP）"""
+    if user is not None and user.is_authenticated:
+        return f"u:{user.pk}"
+    return f"a:{BaseThrottle().get_ident(request)}"
+
+
+def _encode(registers):
+    return base64.b64encode(zlib.compress(bytes(registers))).decode()
+
+
+def _decode(data):
+    return bytearray(zlib.decompress(base64.b64decode(data)))
+
+
+class ViewBuffer:
+    """プロセス内のスケッチ（投稿 ID → レジスタ）。flush はリクエスト外のスレッドで行う"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sketches = {}
+        self._last_flush = time.monotonic()
+        self._flushing = False
+
+    def record(self, post_ids, key):
+        index, rank = register_of(key)
+        with self._lock:
+            for post_id in post_ids:
+                registers = self._sketches.get(post_id)
+                if registers is None:
+                    registers = self._sketches[post_id] = bytearray(REGISTERS)
+                if rank > registers[index]:
+                    registers[index] = rank
+            due = (
+                len(self._sketches) >= settings.VIEW_BUFFER_MAX_POSTS
+                or time.monotonic() - self._last_flush >= settings.VIEW_FLUSH_SECONDS
+            )
+            if due and not self._flushing:
+                self._flushing = True
+                threading.Thread(target=self._flush_in_thread, daemon=True).start()
+
+    def take(self):
+        with self._lock:
+            sketches, self._sketches = self._sketches, {}
+            self._last_flush = time.monotonic()
+        return sketches
+
+    def flush(self):
+        """たまったスケッチを書き出す（書き出した投稿数）"""
+        sketches = self.take()
+        if sketches:
+            if settings.ASYNC_SIDE_EFFECTS:
+                enqueue("posts.views", {"sketches": {str(pk): _encode(r) for pk, r in sketches.items()}})
+            else:
+                apply_sketches(sketches)
+        return len(sketches)
+
+    def _flush_in_thread(self):
+        try:
+            self.flush()
+        except Exception:
+            # 失敗した分は捨てる（閲覧数は推定値なので多少の欠損は許容する）
+            logger.exception("failed to flush view sketches")
+        finally:
+            # このスレッドの接続は二度と使わないので閉じる（close_old_connections は
+            # CONN_MAX_AGE 内の接続を残すため、フラッシュごとに接続が増えていく）
+            connections.close_all()
+            self._flushing = False
+
+
+_buffer = ViewBuffer()
+
+
+def record_views(post_ids, key):
+    """投稿の閲覧を記録する（プロセス内に畳み込むだけ）"""
+    if settings.VIEW_TRACKING and post_ids:
+        _buffer.record(post_ids, key)
+
+
+def flush():
+    return _buffer.flush()
+
+
+def apply_sketches(sketches):
+    """
+    {投稿 ID: レジスタ} を PostViewSketch にマージし、Post.view_count を更新する
+
+    同じ投稿を同時にマージしないよう Post の行を ID 順にロックする
+    """
+    with transaction.atomic():
+        post_ids = list(
+            Post.objects.select_for_update()
+            .filter(pk__in=sketches)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        existing = {
+            sketch.post_id: sketch for sketch in PostViewSketch.objects.filter(post_id__in=post_ids)
+        }
+        now = timezone.now()
+        created, updated, posts = [], [], []
+        for post_id in post_ids:
+            sketch = existing.get(post_id)
+            if sketch is None:
+                sketch = PostViewSketch(post_id=post_id, registers=bytes(REGISTERS))
+                created.append(sketch)
+            else:
+                updated.append(sketch)
+            registers = merge(bytearray(sketch.registers), sketches[post_id])
+            sketch.registers = bytes(registers)
+            sketch.updated_at = now
+            posts.append(Post(pk=post_id, view_count=estimate(registers)))
+        PostViewSketch.objects.bulk_create(created)
+        PostViewSketch.objects.bulk_update(updated, ["registers", "updated_at"])
+        Post.objects.bulk_update(posts, ["view_count"])
+
+
+@job_handler("posts.views")
+def apply_sketches_job(payloads):
+    """閲覧スケッチのハンドラ（マージは最大値なので再実行しても同じ結果）"""
+    sketches = {}
+    for payload in payloads:
+        for post_id, data in payload["sketches"].items():
+            post_id = int(post_id)
+            registers = _decode(data)
+            if post_id in sketches:
+                merge(sketches[post_id], registers)
+            else:
+                sketches[post_id] = registers
+    apply_sketches(sketches)
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception:
+        logger.exception("failed to flush view sketches at exit")
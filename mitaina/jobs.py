@@ -0,0 +1,166 @@
+"""DB ベースのジョブキュー（SELECT ... FOR UPDATE SKIP LOCKED）"""
+import logging
+import traceback
+from collections import defaultdict
+from datetime import timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# ハンドラを定義しているモジュール（ワーカー起動時に import して登録する）
+HANDLER_MODULES = [
+    "mitaina.services",
+    "mitaina.maintenance",
+    "mitaina.impressions",
+]
+
+_handlers = {}
+_discovered = False
+
+
+def job_handler(name):
+    """
+    ジョブハンドラを登録するデコレータ
+
+    ハンドラは同じ name のジョブの payload のリストを受け取り、まとめて処理する。
+    ワーカーが途中で落ちると再実行されるので、ハンドラは冪等にすること
+    """
+    def decorator(func):
+        _handlers[name] = func
+        return func
+    return decorator
+
+
+def autodiscover():
+    global _discovered
+    if not _discovered:
+        for module in HANDLER_MODULES:
+            import_module(module)
+        _discovered = True
+
+
+def enqueue(name, payload=None, run_at=None, max_attempts=None):
+    """ジョブを登録する（呼び出し元のトランザクションと一緒にコミットされる）"""
+    return Job.objects.create(
+        name=name,
+        payload=payload or {},
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+
+
+def backoff_seconds(attempts):
+    """リトライまでの待ち秒数（指数バックオフ）"""
+    return min(settings.JOB_RETRY_BASE_SECONDS * (2 ** (attempts - 1)), settings.JOB_RETRY_MAX_SECONDS)
+
+
+def _mark_failed(jobs, exc):
+    error = "".join(traceback.format_exception(exc))[-4000:]
+    now = timezone.now()
+    for job in jobs:
+        # attempts は取得時に数えてある
+        job.last_error = error
+        if job.attempts >= job.max_attempts:
+            job.status = "failed"
+        else:
+            job.status = "pending"
+            job.run_at = now + timedelta(seconds=backoff_seconds(job.attempts))
+    Job.objects.bulk_update(jobs, ["attempts", "last_error", "status", "run_at"])
+
+
+def _run_group(handler, jobs):
+    """
+    同名ジョブをまとめて実行する
+
+    失敗したら1件ずつ実行し直して、原因のジョブだけリトライに回す
+
+    Returns:
+        list: 成功したジョブの pk
+    """
+    try:
+        handler([job.payload for job in jobs])
+        return [job.pk for job in jobs]
+    except Exception as exc:
+        if len(jobs) == 1:
+            logger.exception("job %s (%s) failed", jobs[0].pk, jobs[0].name)
+            _mark_failed(jobs, exc)
+            return []
+
+    done = []
+    for job in jobs:
+        done.extend(_run_group(handler, [job]))
+    return done
+
+
+def claim_jobs(names=None, batch_size=100):
+    """
+    実行可能なジョブを最大 batch_size 件取得して running にする
+
+    SKIP LOCKED で取得するので複数ワーカーが同じジョブを取り合わない。
+    run_at を JOB_VISIBILITY_TIMEOUT 秒後にずらしておき、ワーカーが落ちて
+    完了しなかったジョブは期限後に他のワーカーが拾い直す。
+
+    attempts は取得時に増やす。ワーカーごと落とすジョブも max_attempts 回で
+    止まるよう、最後の試行中に落ちて拾い直されたジョブは failed にする
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        qs = Job.objects.select_for_update(skip_locked=True).filter(
+            status__in=["pending", "running"],
+            run_at__lte=now,
+        )
+        if names:
+            qs = qs.filter(name__in=names)
+        jobs = list(qs.order_by("run_at", "id")[:batch_size])
+        exhausted = [job.pk for job in jobs if job.attempts >= job.max_attempts]
+        if exhausted:
+            Job.objects.filter(pk__in=exhausted).update(
+                status="failed",
+                last_error="Worker did not finish the last attempt (crashed or exceeded JOB_VISIBILITY_TIMEOUT)",
+            )
+        jobs = [job for job in jobs if job.attempts < job.max_attempts]
+        if jobs:
+            Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                status="running",
+                attempts=F("attempts") + 1,
+                run_at=now + timedelta(seconds=settings.JOB_VISIBILITY_TIMEOUT),
+            )
+            for job in jobs:
+                job.attempts += 1
+    return jobs
+
+
+def run_batch(names=None, batch_size=100):
+    """
+    ジョブを1バッチ分取得して処理する
+
+    Returns:
+        int: 取得したジョブ数
+    """
+    autodiscover()
+    jobs = claim_jobs(names, batch_size)
+    if not jobs:
+        return 0
+
+    groups = defaultdict(list)
+    for job in jobs:
+        groups[job.name].append(job)
+
+    done = []
+    for name, group in groups.items():
+        handler = _handlers.get(name)
+        if handler is None:
+            _mark_failed(group, LookupError(f"No handler registered for job: {name}"))
+            continue
+        done.extend(_run_group(handler, group))
+
+    # 成功したジョブは残さない（テーブルを小さく保つ）
+    Job.objects.filter(pk__in=done).delete()
+    return len(jobs)
@@ -0,0 +1,167 @@
+"""
+メールのアウトボックス
+
+EMAIL_BACKEND = "mitaina.mail.OutboxEmailBackend" にすると、リクエスト中の
+send_mail（パスワードリセットなど）は OutboundEmail に行を書くだけになり、
+SMTP サーバーが遅くてもワーカーを止めない。実際の送信は send_outbox コマンドが
+1本の SMTP 接続を使い回してまとめて行い、失敗したものは指数バックオフで再送する。
+
+ローカルでは aiosmtpd を SMTP サーバーの代わりに使える:
+
+    python -m aiosmtpd -n -l 127.0.0.1:1025
+    EMAIL_PORT=1025 python manage.py send_outbox --once
+"""
+import logging
+import smtplib
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.backends.smtp import EmailBackend as SMTPEmailBackend
+from django.core.mail.message import sanitize_address
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .jobs import backoff_seconds
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxEmailBackend(BaseEmailBackend):
+    """メールを送らずに OutboundEmail に書く（呼び出し元のトランザクションと一緒にコミットされる）"""
+
+    def send_messages(self, email_messages):
+        rows = []
+        for message in email_messages:
+            recipients = message.recipients()
+            if not recipients:
+                continue
+            # SMTP バックエンドが送信時に行う変換をここで済ませておく
+            encoding = message.encoding or settings.DEFAULT_CHARSET
+            rows.append(OutboundEmail(
+                from_email=sanitize_address(message.from_email, encoding),
+                recipients=[sanitize_address(address, encoding) for address in recipients],
+                message=message.message().as_bytes(linesep="\r\n"),
+                max_attempts=settings.EMAIL_OUTBOX_MAX_ATTEMPTS,
+            ))
+        try:
+            OutboundEmail.objects.bulk_create(rows)
+        except Exception:
+            if not self.fail_silently:
+                raise
+            return 0
+        return len(rows)
+
+
+def claim_emails(batch_size=100):
+    """
+    送信できるメールを最大 batch_size 件取得して sending にする（claim_jobs と同じ方式）
+
+    送信中に落ちたものは JOB_VISIBILITY_TIMEOUT 秒後に他の送信プロセスが拾い直す。
+    attempts は取得時に増やし、最後の試行中に落ちたものは failed にする
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status__in=["pending", "sending"], run_at__lte=now)
+            .order_by("run_at", "id")[:batch_size]
+        )
+        exhausted = [email.pk for email in emails if email.attempts >= email.max_attempts]
+        if exhausted:
+            OutboundEmail.objects.filter(pk__in=exhausted).update(
+                status="failed",
+                last_error="Sender did not finish the last attempt (crashed or exceeded JOB_VISIBILITY_TIMEOUT)",
+            )
+        emails = [email for email in emails if email.attempts < email.max_attempts]
+        if emails:
+            OutboundEmail.objects.filter(pk__in=[email.pk for email in emails]).update(
+                status="sending",
+                attempts=F("attempts") + 1,
+                run_at=now + timedelta(seconds=settings.JOB_VISIBILITY_TIMEOUT),
+            )
+            for email in emails:
+                email.attempts += 1
+    return emails
+
+
+def _mark_failed(emails, error, permanent=False, refund=False):
+    """
+    失敗したメールを再送に回す（attempts を使い切ったもの・permanent なものは failed）
+
+    refund=True は取得時に数えた試行を戻す（SMTP サーバーの停止などはメールの失敗に
+    数えず、停止が長引いても failed にしない）
+    """
+    now = timezone.now()
+    for email in emails:
+        # attempts は取得時に数えてある
+        email.last_error = error[-4000:]
+        if refund:
+            email.attempts -= 1
+        if permanent or email.attempts >= email.max_attempts:
+            email.status = "failed"
+        else:
+            email.status = "pending"
+            email.run_at = now + timedelta(seconds=backoff_seconds(max(email.attempts, 1)))
+    OutboundEmail.objects.bulk_update(emails, ["attempts", "last_error", "status", "run_at"])
+
+
+def _is_permanent(exc):
+    """5xx の応答（宛先不明など）は再送しても成功しない"""
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in exc.recipients.values())
+    return isinstance(exc, smtplib.SMTPResponseException) and exc.smtp_code >= 500
+
+
+def deliver_batch(connection, batch_size=100):
+    """
+    メールを1バッチ分取得して connection（使い回す SMTP バックエンド）で送る
+
+    接続が切れていたら1回だけ張り直す。繋がらなければこのバッチの残りを試行に数えず再送に回す
+
+    Returns:
+        dict: {"sent": 件数, "retry": 件数, "failed": 件数}
+    """
+    emails = claim_emails(batch_size)
+    counts = {"sent": 0, "retry": 0, "failed": 0}
+    for index, email in enumerate(emails):
+        try:
+            refused = _sendmail(connection, email)
+        except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, smtplib.SMTPAuthenticationError, OSError) as exc:
+            # メールではなく接続・設定の問題なので、試行に数えず残りをまとめて再送に回す
+            remaining = emails[index:]
+            _mark_failed(remaining, "".join(traceback.format_exception(exc)), refund=True)
+            counts["retry"] += len(remaining)
+            break
+        except smtplib.SMTPException as exc:
+            permanent = _is_permanent(exc)
+            _mark_failed([email], "".join(traceback.format_exception(exc)), permanent=permanent)
+            counts["failed" if email.status == "failed" else "retry"] += 1
+        else:
+            if refused:
+                logger.warning("email %s: some recipients were refused: %s", email.pk, refused)
+            # 送ったらすぐ消す（バッチの途中で止まっても送信済みのものを再送しない）
+            OutboundEmail.objects.filter(pk=email.pk).delete()
+            counts["sent"] += 1
+    return counts
+
+
+def _sendmail(connection, email):
+    """1通送る（接続がなければ張り、切れていたら1回だけ張り直す）"""
+    for attempt in range(2):
+        if connection.connection is None:
+            connection.open()
+        try:
+            return connection.connection.sendmail(email.from_email, email.recipients, bytes(email.message))
+        except (smtplib.SMTPServerDisconnected, OSError):
+            connection.close()
+            if attempt:
+                raise
+
+
+def smtp_connection():
+    """送信用の SMTP バックエンド（EMAIL_HOST などの設定を使う。open() は最初の送信時）"""
+    return SMTPEmailBackend(fail_silently=False)
@@ -0,0 +1,384 @@
+"""メンテナンス処理（バッチ削除など）"""
+import re
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import Greatest, RowNumber
+from django.utils import timezone
+
+from .jobs import job_handler
+from .models import (
+    User,
+    Post,
+    Reaction,
+    ReactionSet,
+    Follow,
+    Notification,
+    Report,
+    PostSimilarityBucket,
+    PostViewSketch,
+    FollowRecommendation,
+)
+from . import follow_cache, user_stats
+from .reactions import REACTION_BITS, bitmask_enabled, storage_model, types_from_mask
+from .services import REACTION_COUNTER_FIELDS
+
+# 投稿を物理削除する前に消しておく依存テーブル（モデル, 投稿への FK 名）
+POST_DEPENDENTS = [
+    (Reaction, "post"),
+    (ReactionSet, "post"),
+    (Notification, "post"),
+    (Report, "post"),
+    (PostSimilarityBucket, "post"),
+    (PostViewSketch, "post"),
+]
+
+_AGE_UNITS = {"d": "days", "h": "hours", "m": "minutes"}
+
+
+def parse_age(value):
+    """'30d' / '12h' / '90m' を timedelta に変換"""
+    match = re.fullmatch(r"(\d+)([dhm])", value.strip())
+    if not match:
+        raise ValueError(f"Invalid age: {value} (use e.g. 30d, 12h, 90m)")
+    amount, unit = match.groups()
+    return timedelta(**{_AGE_UNITS[unit]: int(amount)})
+
+
+def _add_counts(totals, counts):
+    for table, n in counts.items():
+        totals[table] = totals.get(table, 0) + n
+
+
+def delete_in_batches(queryset, batch_size=1000, sleep=0):
+    """
+    queryset の行を batch_size 件ずつ削除する
+
+    1バッチ = 1トランザクションにして、巨大な DELETE や長時間ロックを避ける
+
+    Returns:
+        int: 削除した行数
+    """
+    model = queryset.model
+    total = 0
+    while True:
+        with transaction.atomic():
+            pks = list(queryset.order_by().values_list("pk", flat=True)[:batch_size])
+            if not pks:
+                break
+            deleted, _ = model.objects.filter(pk__in=pks).delete()
+            total += deleted
+        if sleep:
+            time.sleep(sleep)
+    return total
+
+
+def _purge_reactions(model, post_ids, batch_size=1000, sleep=0):
+    """投稿へのリアクションをバッチで削除し、付けたユーザーの reactions_given を戻す"""
+    # reactions_given は今の保存形式の行から数えている
+    count_given = model is storage_model()
+    type_column = "mask" if model is ReactionSet else "reaction_type"
+    total = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                model.objects.filter(post_id__in=post_ids)
+                .order_by()
+                .values_list("pk", "user_id", type_column)[:batch_size]
+            )
+            if not rows:
+                break
+            model.objects.filter(pk__in=[pk for pk, _, _ in rows]).delete()
+
+            if count_given:
+                given = defaultdict(int)
+                for _, user_id, value in rows:
+                    given[user_id] += len(types_from_mask(value)) if model is ReactionSet else 1
+                for user_id in sorted(given):
+                    user_stats.bump(user_id, reactions_given=-given[user_id])
+            total += len(rows)
+        if sleep:
+            time.sleep(sleep)
+    return total
+
+
+def purge_posts(post_ids, batch_size=1000, sleep=0):
+    """
+    投稿を依存行ごと物理削除する（依存行を先にバッチで削除）
+
+    消えたリアクションは付けたユーザーの reactions_given からも引く
+
+    Returns:
+        dict: {テーブル名: 削除行数}
+    """
+    counts = {}
+    for model, fk_name in POST_DEPENDENTS:
+        if model in (Reaction, ReactionSet):
+            counts[model._meta.db_table] = _purge_reactions(model, post_ids, batch_size, sleep)
+            continue
+        qs = model.objects.filter(**{f"{fk_name}_id__in": post_ids})
+        counts[model._meta.db_table] = delete_in_batches(qs, batch_size, sleep)
+
+    with transaction.atomic():
+        deleted, _ = Post.objects.filter(pk__in=post_ids).delete()
+    counts[Post._meta.db_table] = deleted
+    return counts
+
+
+def purge_deleted_posts(older_than, batch_size=500, sleep=0, on_batch=None):
+    """
+    論理削除から older_than 以上経過した投稿を ID 範囲のバッチで物理削除
+
+    Args:
+        older_than: timedelta
+        on_batch: バッチごとに呼ばれるコールバック (counts, elapsed_seconds)
+
+    Returns:
+        dict: {テーブル名: 削除行数}
+    """
+    cutoff = timezone.now() - older_than
+    totals = {}
+    last_id = 0
+    while True:
+        post_ids = list(
+            Post.objects.filter(deleted_at__lt=cutoff, id__gt=last_id)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not post_ids:
+            break
+        last_id = post_ids[-1]
+
+        started = time.monotonic()
+        counts = purge_posts(post_ids, batch_size=batch_size, sleep=sleep)
+        _add_counts(totals, counts)
+        if on_batch:
+            on_batch(counts, time.monotonic() - started)
+    return totals
+
+
+# アーカイブに書き出す通知の列
+NOTIFICATION_ARCHIVE_FIELDS = (
+    "id", "user_id", "actor_id", "notification_type", "post_id", "is_read", "created_at"
+)
+
+
+def prunable_notifications(keep_per_user=None, older_than=None, user_ids=None):
+    """
+    保持ポリシーから外れた通知（どちらかの条件に当てはまれば対象）
+
+    Args:
+        keep_per_user: ユーザーごとに新しい順でこの件数だけ残す
+        older_than: timedelta。これより古いものは件数に関係なく対象
+        user_ids: 対象ユーザーを絞る（None なら全員）
+    """
+    if not keep_per_user and older_than is None:
+        raise ValueError("keep_per_user or older_than is required")
+
+    qs = Notification.objects.order_by()
+    if user_ids is not None:
+        qs = qs.filter(user_id__in=user_ids)
+    conditions = Q()
+    if older_than is not None:
+        conditions |= Q(created_at__lt=timezone.now() - older_than)
+    if keep_per_user:
+        qs = qs.annotate(
+            rank=Window(
+                RowNumber(),
+                partition_by=F("user_id"),
+                order_by=[F("created_at").desc(), F("id").desc()],
+            )
+        )
+        conditions |= Q(rank__gt=keep_per_user)
+    return qs.filter(conditions)
+
+
+def prune_notifications(
+    keep_per_user=None, older_than=None, batch_size=1000, user_batch_size=200, sleep=0, archive=None, on_batch=None
+):
+    """
+    保持ポリシーから外れた通知をユーザー ID 範囲ごとにバッチで物理削除
+
+    月単位で丸ごと消せる分は manage_partitions --retain-months の方が安い。
+    こちらは件数上限と、月の途中の期限を扱う
+
+    Args:
+        archive: NdjsonArchive など。削除する行を先に write(rows) する
+        on_batch: バッチごとに呼ばれるコールバック (rows, elapsed_seconds)
+
+    Returns:
+        int: 削除した行数
+    """
+    total = 0
+    last_user_id = 0
+    while True:
+        user_ids = list(
+            User.objects.filter(id__gt=last_user_id).order_by("id").values_list("id", flat=True)[:user_batch_size]
+        )
+        if not user_ids:
+            break
+        last_user_id = user_ids[-1]
+
+        # 1ユーザーに大量の通知があっても1トランザクションは batch_size 件まで
+        while True:
+            started = time.monotonic()
+            with transaction.atomic():
+                rows = list(
+                    prunable_notifications(keep_per_user, older_than, user_ids=user_ids)
+                    .values(*NOTIFICATION_ARCHIVE_FIELDS)[:batch_size]
+                )
+                if not rows:
+                    break
+                if archive is not None:
+                    archive.write(rows)
+                Notification.objects.filter(pk__in=[row["id"] for row in rows]).delete()
+            total += len(rows)
+            if on_batch:
+                on_batch(len(rows), time.monotonic() - started)
+            if sleep:
+                time.sleep(sleep)
+    return total
+
+
+_POST_COUNTERS_SQL = """
+UPDATE {post} AS p SET {updates}
+FROM (
+    SELECT p.id, {counts}
+    FROM {post} AS p
+    LEFT JOIN {reactions} AS r ON r.post_id = p.id
+    WHERE p.id BETWEEN %s AND %s
+    GROUP BY p.id
+) AS c
+WHERE p.id = c.id AND ({current}) IS DISTINCT FROM ({computed})
+"""
+
+
+def reconcile_post_counters(low, high):
+    """
+    ID が low〜high の投稿のリアクション数（like_count など）を保存形式の行から数え直す
+
+    Returns:
+        int: 修正した投稿の数（一致していた投稿は更新しない）
+    """
+    fields = list(REACTION_COUNTER_FIELDS.values())
+    if bitmask_enabled():
+        conditions = [f"r.mask & {REACTION_BITS[t]} <> 0" for t in REACTION_COUNTER_FIELDS]
+    else:
+        conditions = [f"r.reaction_type = '{t}'" for t in REACTION_COUNTER_FIELDS]
+    sql = _POST_COUNTERS_SQL.format(
+        post=Post._meta.db_table,
+        reactions=storage_model()._meta.db_table,
+        counts=", ".join(
+            f"COUNT(r.id) FILTER (WHERE {condition}) AS {field}" for field, condition in zip(fields, conditions)
+        ),
+        updates=", ".join(f"{field} = c.{field}" for field in fields),
+        current=", ".join(f"p.{field}" for field in fields),
+        computed=", ".join(f"c.{field}" for field in fields),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [low, high])
+        return cursor.rowcount
+
+
+def _drain_reactions(user, batch_size=1000, sleep=0):
+    """ユーザーのリアクションをバッチで削除し、投稿のカウンタを集合演算で戻す"""
+    # bitmask 形式なら1行に複数タイプが入っている
+    model = storage_model()
+    type_column = "mask" if bitmask_enabled() else "reaction_type"
+    total = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                model.objects.filter(user_id=user.pk)
+                .order_by()
+                .values_list("pk", "post_id", type_column)[:batch_size]
+            )
+            if not rows:
+                break
+            model.objects.filter(pk__in=[pk for pk, _, _ in rows]).delete()
+
+            post_ids_by_type = defaultdict(list)
+            for _, post_id, value in rows:
+                for reaction_type in (types_from_mask(value) if model is ReactionSet else [value]):
+                    post_ids_by_type[reaction_type].append(post_id)
+            for reaction_type, post_ids in post_ids_by_type.items():
+                field = REACTION_COUNTER_FIELDS[reaction_type]
+                Post.objects.filter(pk__in=sorted(post_ids)).update(
+                    **{field: Greatest(F(field) - 1, 0)}
+                )
+
+            # 投稿者の受けたリアクション数も戻す（論理削除済みの投稿はもう集計に入っていない）
+            authors = dict(
+                Post.objects.filter(pk__in={post_id for _, post_id, _ in rows}, deleted_at__isnull=True)
+                .values_list("pk", "author_id")
+            )
+            received = defaultdict(lambda: defaultdict(int))
+            for reaction_type, post_ids in post_ids_by_type.items():
+                for post_id in post_ids:
+                    if post_id in authors:
+                        received[authors[post_id]][user_stats.RECEIVED_FIELDS[reaction_type]] -= 1
+            for author_id in sorted(received):
+                user_stats.bump(author_id, **received[author_id])
+            total += len(rows)
+        if sleep:
+            time.sleep(sleep)
+    return total
+
+
+def drain_account(user, batch_size=500, sleep=0):
+    """
+    退会ユーザーの依存行をバッチで削除し、最後にユーザー本体を削除する
+
+    ユーザーを直接 delete() すると全依存行が1トランザクションで CASCADE され、
+    人気投稿の Post/Reaction 行を長時間ロックするため、小さなバッチに分けて消す
+
+    Returns:
+        dict: {テーブル名: 削除行数}
+    """
+    totals = {}
+
+    # 1. 自分の投稿（依存行ごと）
+    while True:
+        post_ids = list(
+            Post.objects.filter(author_id=user.pk).order_by("id").values_list("id", flat=True)[:batch_size]
+        )
+        if not post_ids:
+            break
+        _add_counts(totals, purge_posts(post_ids, batch_size=batch_size, sleep=sleep))
+
+    # 2. 他人の投稿へのリアクション（カウンタを戻す）
+    _add_counts(totals, {storage_model()._meta.db_table: _drain_reactions(user, batch_size, sleep)})
+
+    # 3. 通報・通知・フォロー・おすすめ
+    # フォロワーのフォロー先キャッシュから消えるよう、フォローを消した後に無効化する
+    follower_ids = list(Follow.objects.filter(following_id=user.pk).values_list("follower_id", flat=True))
+    for qs in (
+        # 切り替え前の形式で残っている行（カウンタには反映済みなので消すだけ）
+        Reaction.objects.filter(user_id=user.pk),
+        ReactionSet.objects.filter(user_id=user.pk),
+        Report.objects.filter(reporter_id=user.pk),
+        Notification.objects.filter(user_id=user.pk),
+        Notification.objects.filter(actor_id=user.pk),
+        Follow.objects.filter(follower_id=user.pk),
+        Follow.objects.filter(following_id=user.pk),
+        FollowRecommendation.objects.filter(user_id=user.pk),
+        FollowRecommendation.objects.filter(candidate_id=user.pk),
+    ):
+        _add_counts(totals, {qs.model._meta.db_table: delete_in_batches(qs, batch_size, sleep)})
+    follow_cache.invalidate(user.pk, *follower_ids)
+
+    # 4. ユーザー本体（残りはトークン等の小さな行のみ）
+    with transaction.atomic():
+        user.delete()
+    return totals
+
+
+@job_handler("accounts.drain")
+def drain_accounts_job(payloads):
+    """退会ジョブのハンドラ（処理済み・取り消し済みのユーザーは無視）"""
+    user_ids = {p["user_id"] for p in payloads}
+    for user in User.objects.filter(pk__in=user_ids, deletion_requested_at__isnull=False):
+        drain_account(user)
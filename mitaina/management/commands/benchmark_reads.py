@@ -0,0 +1,190 @@
+import socket
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from mitaina.models import Post
+
+# (名前, 同期版パス, 非同期版パス)
+ENDPOINTS = (
+    ("post list", "/api/posts/", "/api/async/posts/"),
+    ("post detail", "/api/posts/{post_id}/", "/api/async/posts/{post_id}/"),
+    ("feed", "/api/feed/", "/api/async/feed/"),
+    ("user", "/api/users/{username}/", "/api/async/users/{username}/"),
+    ("notifications", "/api/me/notifications/", "/api/async/me/notifications/"),
+)
+
+
+def _percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(int(len(sorted_values) * p / 100), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def _wait_for_port(url, timeout):
+    """サーバーが接続を受け付けるまで待つ（HTTP リクエストは送らない）"""
+    parts = urlsplit(url)
+    address = (parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection(address, timeout=1).close()
+            return
+        except OSError:
+            if time.monotonic() >= deadline:
+                raise CommandError(f"{url} is not accepting connections")
+            time.sleep(0.05)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the sync (WSGI) and async (ASGI) read endpoints under concurrent load. "
+        "Start both servers first, e.g. `gunicorn config.wsgi -b :8000` and "
+        "`uvicorn config.asgi:application --port 8001`. "
+        "With --first-request, compare the first request after a (re)start with the following "
+        "ones; start the servers with a single worker (e.g. `gunicorn config.wsgi -w 1`) right "
+        "before running, once with WARMUP=0 and once with WARMUP=1"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sync-url", default="http://127.0.0.1:8000")
+        parser.add_argument("--async-url", default="http://127.0.0.1:8001")
+        parser.add_argument("--token", help="API token (required for feed and notifications)")
+        parser.add_argument("--post-id", type=int, help="defaults to the newest post")
+        parser.add_argument("--username", help="defaults to the newest post's author")
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument("--requests", type=int, default=500, help="requests per endpoint and server")
+        parser.add_argument("--only", help="comma-separated endpoint names to run")
+        parser.add_argument(
+            "--first-request",
+            action="store_true",
+            help="measure cold (first) vs warm request latency instead of throughput",
+        )
+        parser.add_argument("--warm-requests", type=int, default=20, help="warm requests per endpoint")
+        parser.add_argument("--wait", type=float, default=30, help="seconds to wait for the servers to listen")
+        parser.add_argument(
+            "--settle",
+            type=float,
+            default=3,
+            help="seconds to sleep after the servers listen (lets boot-time warm-up finish)",
+        )
+
+    def _run(self, url, headers, total, concurrency):
+        """url に total 回リクエストし、(経過秒, 成功時のレイテンシ一覧, エラー数) を返す"""
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        def fetch(_):
+            started = time.perf_counter()
+            try:
+                response = session.get(url, headers=headers, timeout=30)
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            return ok, time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(fetch, range(total)))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for ok, latency in results if ok)
+        return elapsed, latencies, len(results) - len(latencies)
+
+    def _report(self, label, elapsed, latencies, errors):
+        ms = [v * 1000 for v in latencies]
+        self.stdout.write(
+            f"  {label:<5} rps={len(latencies) / elapsed:8.1f}"
+            f"  p50={_percentile(ms, 50):7.1f}ms"
+            f"  p95={_percentile(ms, 95):7.1f}ms"
+            f"  p99={_percentile(ms, 99):7.1f}ms"
+            f"  mean={statistics.fmean(ms) if ms else 0:7.1f}ms"
+            f"  errors={errors}"
+        )
+
+    def _first_request(self, endpoints, headers, warm_requests):
+        """
+        各エンドポイントの最初のリクエスト（cold）と、その後の中央値（warm）を比べる
+
+        最初のエンドポイントの cold にはプロセス全体の初期化（URL の解決表・DB 接続など）、
+        以降のエンドポイントにはビューごとの初期化が含まれる
+        """
+        first = {}
+        for name, url in endpoints:
+            session = requests.Session()
+            started = time.perf_counter()
+            response = session.get(url, headers=headers, timeout=30)
+            first[name] = ((time.perf_counter() - started) * 1000, response.status_code)
+
+        for name, url in endpoints:
+            session = requests.Session()
+            latencies = []
+            for _ in range(warm_requests):
+                started = time.perf_counter()
+                session.get(url, headers=headers, timeout=30)
+                latencies.append((time.perf_counter() - started) * 1000)
+            cold, status_code = first[name]
+            warm = statistics.median(latencies) if latencies else 0
+            self.stdout.write(
+                f"  {name:<14} cold={cold:7.1f}ms  warm(p50)={warm:7.1f}ms"
+                f"  x{cold / warm if warm else 0:5.1f}  status={status_code}"
+            )
+
+    def handle(self, *args, **options):
+        headers = {"Authorization": f"Token {options['token']}"} if options["token"] else {}
+
+        params = {"post_id": options["post_id"], "username": options["username"]}
+        if options["first_request"] and (params["post_id"] is None or params["username"] is None):
+            # サーバーに問い合わせると温まってしまうので DB から直接選ぶ
+            post = Post.objects.filter(deleted_at__isnull=True).select_related("author").order_by("-id").first()
+            if post is None:
+                raise CommandError("No posts found; pass --post-id and --username")
+            params["post_id"] = params["post_id"] or post.pk
+            params["username"] = params["username"] or post.author.username
+        elif params["post_id"] is None or params["username"] is None:
+            response = requests.get(f"{options['sync_url']}/api/posts/", timeout=30)
+            results = response.json().get("results") if response.ok else None
+            if not results:
+                raise CommandError("No posts found; pass --post-id and --username")
+            params["post_id"] = params["post_id"] or results[0]["id"]
+            params["username"] = params["username"] or results[0]["author"]["public_id"]
+
+        only = set(options["only"].split(",")) if options["only"] else None
+
+        if options["first_request"]:
+            servers = (("sync", options["sync_url"], 1), ("async", options["async_url"], 2))
+            for _, base, _ in servers:
+                _wait_for_port(base, options["wait"])
+            time.sleep(options["settle"])
+            for label, base, index in servers:
+                endpoints = [
+                    (endpoint[0], base + endpoint[index].format(**params))
+                    for endpoint in ENDPOINTS
+                    if not (only and endpoint[0] not in only)
+                    and (options["token"] or endpoint[0] not in ("feed", "notifications"))
+                ]
+                self.stdout.write(f"{label}:")
+                self._first_request(endpoints, headers, options["warm_requests"])
+            return
+
+        for name, sync_path, async_path in ENDPOINTS:
+            if only and name not in only:
+                continue
+            if name in ("feed", "notifications") and not options["token"]:
+                self.stdout.write(f"{name}: skipped (needs --token)")
+                continue
+
+            self.stdout.write(f"{name}:")
+            for label, base, path in (
+                ("sync", options["sync_url"], sync_path),
+                ("async", options["async_url"], async_path),
+            ):
+                url = base + path.format(**params)
+                self._report(label, *self._run(url, headers, options["requests"], options["concurrency"]))
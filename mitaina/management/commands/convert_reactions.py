@@ -0,0 +1,90 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from mitaina.models import Reaction, ReactionSet, User
+
+TO_BITMASK_SQL = """
+INSERT INTO {reactionset} (user_id, post_id, mask, like_at, hatena_at, correct_at, collect_at)
+SELECT
+    user_id,
+    post_id,
+    BIT_OR(CASE reaction_type
+        WHEN 'like' THEN 1 WHEN 'hatena' THEN 2 WHEN 'correct' THEN 4 WHEN 'collect' THEN 8
+    END)::smallint,
+    MAX(created_at) FILTER (WHERE reaction_type = 'like'),
+    MAX(created_at) FILTER (WHERE reaction_type = 'hatena'),
+    MAX(created_at) FILTER (WHERE reaction_type = 'correct'),
+    MAX(created_at) FILTER (WHERE reaction_type = 'collect')
+FROM {reaction}
+WHERE user_id BETWEEN %s AND %s
+GROUP BY user_id, post_id
+"""
+
+TO_ROWS_SQL = """
+INSERT INTO {reaction} (user_id, post_id, reaction_type, created_at)
+SELECT
+    r.user_id,
+    r.post_id,
+    t.reaction_type,
+    CASE t.reaction_type
+        WHEN 'like' THEN r.like_at WHEN 'hatena' THEN r.hatena_at
+        WHEN 'correct' THEN r.correct_at WHEN 'collect' THEN r.collect_at
+    END
+FROM {reactionset} AS r
+CROSS JOIN (VALUES ('like', 1), ('hatena', 2), ('correct', 4), ('collect', 8)) AS t (reaction_type, bit)
+WHERE r.user_id BETWEEN %s AND %s AND r.mask & t.bit <> 0
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild reactions in the given storage format from the other one. "
+        "Run while REACTION_STORAGE still points at the source format (e.g. in a maintenance "
+        "window), then switch REACTION_STORAGE to the target"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--to", choices=["bitmask", "rows"], required=True)
+        parser.add_argument("--batch-size", type=int, default=1000, help="users per transaction")
+        parser.add_argument("--delete-source", action="store_true", help="delete converted source rows")
+
+    def handle(self, *args, **options):
+        target = options["to"]
+        if settings.REACTION_STORAGE == target:
+            raise CommandError(
+                f"REACTION_STORAGE is already '{target}'; the source format is no longer written to"
+            )
+
+        tables = {"reaction": Reaction._meta.db_table, "reactionset": ReactionSet._meta.db_table}
+        if target == "bitmask":
+            insert_sql, source, dest = TO_BITMASK_SQL.format(**tables), tables["reaction"], tables["reactionset"]
+        else:
+            insert_sql, source, dest = TO_ROWS_SQL.format(**tables), tables["reactionset"], tables["reaction"]
+
+        started = time.monotonic()
+        converted = 0
+        last_id = 0
+        while True:
+            user_ids = list(
+                User.objects.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[
+                    : options["batch_size"]
+                ]
+            )
+            if not user_ids:
+                break
+            low, high = user_ids[0], user_ids[-1]
+            with transaction.atomic(), connection.cursor() as cursor:
+                # 変換先は作り直す（何度実行しても同じ結果になる）
+                cursor.execute(f"DELETE FROM {dest} WHERE user_id BETWEEN %s AND %s", [low, high])
+                cursor.execute(insert_sql, [low, high])
+                converted += cursor.rowcount
+                if options["delete_source"]:
+                    cursor.execute(f"DELETE FROM {source} WHERE user_id BETWEEN %s AND %s", [low, high])
+            last_id = high
+
+        self.stdout.write(self.style.SUCCESS(
+            f"done. {dest} rows={converted} ({time.monotonic() - started:.2f}s)"
+        ))
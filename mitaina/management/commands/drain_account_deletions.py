@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from mitaina.maintenance import drain_account
+from mitaina.models import User
+
+
+class Command(BaseCommand):
+    help = "Delete accounts whose deletion was requested, draining dependent rows in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--sleep", type=float, default=0, help="seconds to sleep between batches")
+        parser.add_argument("--limit", type=int, default=None, help="max number of accounts to process")
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(deletion_requested_at__isnull=False).order_by("deletion_requested_at")
+        if options["limit"]:
+            users = users[: options["limit"]]
+
+        processed = 0
+        for user in users:
+            user_id = user.pk
+            started = time.monotonic()
+            totals = drain_account(user, batch_size=options["batch_size"], sleep=options["sleep"])
+            rows = sum(totals.values())
+            self.stdout.write(
+                f"deleted user={user_id}: {rows} dependent rows in {time.monotonic() - started:.2f}s"
+            )
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(f"done. accounts={processed}"))
@@ -0,0 +1,48 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from mitaina.exports import EXPORT_FORMATS, EXPORT_KINDS, iter_export
+
+
+class Command(BaseCommand):
+    help = "Stream posts (with reaction counts) or raw reactions as NDJSON/CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--kind", choices=EXPORT_KINDS, default="posts")
+        parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+        parser.add_argument("--since", help="ISO 8601 datetime; export rows created at or after it")
+        parser.add_argument("--gzip", action="store_true")
+        parser.add_argument("--output", "-o", help="output file (default: stdout)")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"]:
+            since = parse_datetime(options["since"])
+            if since is None:
+                raise CommandError("--since must be an ISO 8601 datetime")
+
+        chunks = iter_export(
+            options["kind"],
+            options["format"],
+            since=since,
+            compress=options["gzip"],
+            chunk_size=options["chunk_size"],
+        )
+
+        out = open(options["output"], "wb") if options["output"] else sys.stdout.buffer
+        written = 0
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+                written += len(chunk)
+        finally:
+            if options["output"]:
+                out.close()
+            else:
+                out.flush()
+
+        if options["output"]:
+            self.stdout.write(self.style.SUCCESS(f"done. bytes={written}, output={options['output']}"))
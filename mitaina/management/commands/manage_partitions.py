@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from mitaina.partitions import (
+    PARTITIONED_TABLES,
+    add_months,
+    default_partition_rows,
+    drop_partitions_before,
+    ensure_partitions,
+    list_partitions,
+    month_start,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Create upcoming monthly partitions and optionally drop old ones "
+        "(run daily, e.g. from the scheduler)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--table", action="append", help="default: all partitioned tables")
+        parser.add_argument("--months-ahead", type=int, default=3)
+        parser.add_argument(
+            "--retain-months",
+            type=int,
+            help="drop partitions older than this many months (current month counts as 1)",
+        )
+        parser.add_argument("--detach-only", action="store_true", help="detach old partitions but keep the tables")
+        parser.add_argument("--list", action="store_true", help="only list partitions")
+
+    def handle(self, *args, **options):
+        tables = options["table"] or list(PARTITIONED_TABLES)
+        for table in tables:
+            if table not in PARTITIONED_TABLES:
+                raise CommandError(f"{table} is not partitioned (choose from {', '.join(PARTITIONED_TABLES)})")
+
+            if options["list"]:
+                for month, name in list_partitions(table):
+                    self.stdout.write(f"{table}: {name} ({month:%Y-%m})")
+            else:
+                for name in ensure_partitions(table, months_ahead=options["months_ahead"]):
+                    self.stdout.write(f"{table}: created {name}")
+
+                if options["retain_months"]:
+                    cutoff = add_months(month_start(timezone.now()), -(options["retain_months"] - 1))
+                    removed = drop_partitions_before(table, cutoff, detach_only=options["detach_only"])
+                    verb = "detached" if options["detach_only"] else "dropped"
+                    for name in removed:
+                        self.stdout.write(f"{table}: {verb} {name}")
+
+            # DEFAULT に入った行は ensure_partitions が月のパーティションへ移す（--list では移さない）
+            rows = default_partition_rows(table)
+            if rows:
+                self.stderr.write(self.style.WARNING(
+                    f"{table}: {rows} rows in the default partition; "
+                    "run without --list to create their months and move them"
+                ))
+        self.stdout.write(self.style.SUCCESS("done."))
@@ -0,0 +1,80 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from mitaina.exports import NdjsonArchive
+from mitaina.maintenance import parse_age, prunable_notifications, prune_notifications
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete notifications outside the retention policy (beyond the newest N per user, "
+        "or older than the retention period) in batches, optionally archiving them first"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--keep-per-user",
+            type=int,
+            default=settings.NOTIFICATION_KEEP_PER_USER,
+            help="keep this many newest notifications per user (0: no limit)",
+        )
+        parser.add_argument(
+            "--older-than",
+            help="e.g. 365d, 12h (default: NOTIFICATION_RETENTION_DAYS; 0d: no limit)",
+        )
+        parser.add_argument("--archive", help="write deleted rows to this file as gzipped NDJSON")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--user-batch-size", type=int, default=200)
+        parser.add_argument("--sleep", type=float, default=0, help="seconds to sleep between batches")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        if options["older_than"]:
+            try:
+                older_than = parse_age(options["older_than"])
+            except ValueError as e:
+                raise CommandError(str(e))
+        else:
+            older_than = timedelta(days=settings.NOTIFICATION_RETENTION_DAYS)
+        if not older_than:
+            older_than = None
+        keep_per_user = options["keep_per_user"] or None
+        if keep_per_user is None and older_than is None:
+            raise CommandError("nothing to do: both --keep-per-user and --older-than are disabled")
+
+        if options["dry_run"]:
+            n = prunable_notifications(keep_per_user, older_than).count()
+            self.stdout.write(self.style.SUCCESS(f"done. prunable_notifications={n}, dry_run=True"))
+            return
+
+        def report(rows, elapsed):
+            rate = rows / elapsed if elapsed else rows
+            self.stdout.write(f"batch: {rows} rows in {elapsed:.2f}s ({rate:.0f} rows/s)")
+
+        archive = None
+        if options["archive"]:
+            archive = NdjsonArchive(open(options["archive"], "ab"))
+
+        started = time.monotonic()
+        try:
+            deleted = prune_notifications(
+                keep_per_user,
+                older_than,
+                batch_size=options["batch_size"],
+                user_batch_size=options["user_batch_size"],
+                sleep=options["sleep"],
+                archive=archive,
+                on_batch=report,
+            )
+        finally:
+            if archive is not None:
+                archive.close()
+        elapsed = time.monotonic() - started
+        rate = deleted / elapsed if elapsed else deleted
+        detail = f", archive={options['archive']}" if archive is not None else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"done. notifications={deleted} ({elapsed:.2f}s, {rate:.0f} rows/s){detail}"
+        ))
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from mitaina.maintenance import parse_age, purge_deleted_posts
+from mitaina.models import Post
+
+
+class Command(BaseCommand):
+    help = "Hard-delete soft-deleted posts (and their reactions/notifications/reports) in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than", default="30d", help="e.g. 30d, 12h (default: 30d)")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--sleep", type=float, default=0, help="seconds to sleep between batches")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        try:
+            older_than = parse_age(options["older_than"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options["dry_run"]:
+            cutoff = timezone.now() - older_than
+            n = Post.objects.filter(deleted_at__lt=cutoff).count()
+            self.stdout.write(self.style.SUCCESS(f"done. purgeable_posts={n}, dry_run=True"))
+            return
+
+        def report(counts, elapsed):
+            rows = sum(counts.values())
+            rate = rows / elapsed if elapsed else rows
+            detail = ", ".join(f"{table}={n}" for table, n in counts.items())
+            self.stdout.write(f"batch: {detail} ({rows} rows in {elapsed:.2f}s, {rate:.0f} rows/s)")
+
+        started = time.monotonic()
+        totals = purge_deleted_posts(
+            older_than,
+            batch_size=options["batch_size"],
+            sleep=options["sleep"],
+            on_batch=report,
+        )
+        elapsed = time.monotonic() - started
+        rows = sum(totals.values())
+        rate = rows / elapsed if elapsed else rows
+        detail = ", ".join(f"{table}={n}" for table, n in totals.items()) or "nothing to purge"
+        self.stdout.write(self.style.SUCCESS(f"done. {detail} ({rows} rows in {elapsed:.2f}s, {rate:.0f} rows/s)"))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from mitaina.recommendations import rebuild_all, refresh_changed
+
+
+class Command(BaseCommand):
+    help = "Rebuild 'who to follow' candidates (incrementally from follow events by default)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="recompute every user instead of only changed ones")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options["full"]:
+            rows = rebuild_all(batch_size=options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(
+                f"done. candidates={rows} ({time.monotonic() - started:.2f}s)"
+            ))
+        else:
+            events = refresh_changed(batch_size=options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(
+                f"done. follow_events={events} ({time.monotonic() - started:.2f}s)"
+            ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from mitaina.models import Post
+from mitaina.similarity import index_posts
+
+
+class Command(BaseCommand):
+    help = "Rebuild MinHash/LSH buckets used for near-duplicate post detection"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        last_id = 0
+        indexed = 0
+        while True:
+            posts = list(
+                Post.objects.filter(id__gt=last_id, deleted_at__isnull=True)
+                .order_by("id")
+                .only("id", "text")[:batch_size]
+            )
+            if not posts:
+                break
+            index_posts(posts)
+            indexed += len(posts)
+            last_id = posts[-1].id
+        self.stdout.write(self.style.SUCCESS(f"done. indexed={indexed}"))
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from mitaina.maintenance import reconcile_post_counters
+from mitaina.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount per-post reaction counters (like/hatena/correct/collect) from the reaction rows "
+        "and fix posts that drifted (run before reconcile_user_stats, which sums these counters)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="posts per transaction")
+        parser.add_argument("--sleep", type=float, default=0, help="seconds to sleep between batches")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        fixed = 0
+        last_id = 0
+        while True:
+            post_ids = list(
+                Post.objects.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[
+                    : options["batch_size"]
+                ]
+            )
+            if not post_ids:
+                break
+            with transaction.atomic():
+                fixed += reconcile_post_counters(post_ids[0], post_ids[-1])
+            last_id = post_ids[-1]
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"done. fixed={fixed} ({time.monotonic() - started:.2f}s)"
+        ))
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from mitaina.models import User
+from mitaina.user_stats import reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute per-user stats (posts, reactions received/given) from posts and reactions "
+        "and fix rows that drifted (run periodically, e.g. after purge_deleted)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="users per transaction")
+        parser.add_argument("--sleep", type=float, default=0, help="seconds to sleep between batches")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        fixed = 0
+        last_id = 0
+        while True:
+            user_ids = list(
+                User.objects.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[
+                    : options["batch_size"]
+                ]
+            )
+            if not user_ids:
+                break
+            with transaction.atomic():
+                fixed += reconcile(user_ids[0], user_ids[-1])
+            last_id = user_ids[-1]
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"done. fixed={fixed} ({time.monotonic() - started:.2f}s)"
+        ))
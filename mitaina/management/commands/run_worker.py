@@ -0,0 +1,38 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from mitaina.jobs import run_batch
+
+
+class Command(BaseCommand):
+    help = "Process background jobs from the database queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queue", action="append", dest="names", help="job name to process (repeatable)")
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="seconds to wait when the queue is empty")
+        parser.add_argument("--once", action="store_true", help="process until the queue is empty, then exit")
+
+    def handle(self, *args, **options):
+        self._stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        processed = 0
+        while not self._stopping:
+            close_old_connections()
+            n = run_batch(names=options["names"], batch_size=options["batch_size"])
+            processed += n
+            if n == 0:
+                if options["once"]:
+                    break
+                time.sleep(options["poll_interval"])
+
+        self.stdout.write(self.style.SUCCESS(f"done. jobs={processed}"))
+
+    def _stop(self, signum, frame):
+        # 処理中のバッチは最後まで実行してから止める
+        self._stopping = True
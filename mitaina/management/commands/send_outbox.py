@@ -0,0 +1,49 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from mitaina.mail import deliver_batch, smtp_connection
+
+
+class Command(BaseCommand):
+    help = (
+        "Deliver queued emails (EMAIL_BACKEND=mitaina.mail.OutboxEmailBackend) in batches "
+        "over a single reused SMTP connection, retrying failures with backoff"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="seconds to wait when the outbox is empty")
+        parser.add_argument("--once", action="store_true", help="send until the outbox is empty, then exit")
+
+    def handle(self, *args, **options):
+        self._stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        connection = smtp_connection()
+        totals = {"sent": 0, "retry": 0, "failed": 0}
+        try:
+            while not self._stopping:
+                close_old_connections()
+                counts = deliver_batch(connection, batch_size=options["batch_size"])
+                for key, n in counts.items():
+                    totals[key] += n
+                if any(counts.values()):
+                    self.stdout.write(", ".join(f"{key}={n}" for key, n in counts.items()))
+                else:
+                    # 空いている間は接続を閉じる（サーバー側のアイドル切断を避ける）
+                    connection.close()
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll_interval"])
+        finally:
+            connection.close()
+
+        self.stdout.write(self.style.SUCCESS("done. " + ", ".join(f"{key}={n}" for key, n in totals.items())))
+
+    def _stop(self, signum, frame):
+        # 送信中のバッチは最後まで送ってから止める
+        self._stopping = True
@@ -0,0 +1,48 @@
+import json
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+# 新しいプロセスで起動から計測する（このコマンド自身はもう Django を読み込み済みのため）
+SCRIPT = """
+import json, os, time
+started = time.perf_counter()
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+app_seconds = time.perf_counter() - started
+from mitaina.warmup import warm_up
+queries = {queries}
+cold = warm_up(queries=queries)
+warm = warm_up(queries=queries)
+print(json.dumps({{"app": app_seconds, "cold": cold, "warm": warm}}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure startup in a fresh process: app load time, then each warm-up step "
+        "on its first (cold) and second (warm) run"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queries", action="store_true", help="also time the representative queries")
+
+    def handle(self, *args, **options):
+        result = subprocess.run(
+            [sys.executable, "-c", SCRIPT.format(queries=options["queries"])],
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(result.stderr.strip() or "startup measurement failed")
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+
+        self.stdout.write(f"app load: {report['app'] * 1000:8.1f}ms")
+        for (name, cold), (_, warm) in zip(report["cold"], report["warm"]):
+            cold_ms = f"{cold * 1000:8.1f}ms" if cold is not None else "  failed"
+            warm_ms = f"{warm * 1000:8.1f}ms" if warm is not None else "  failed"
+            self.stdout.write(f"{name + ':':<10}cold={cold_ms}  warm={warm_ms}")
+        total = report["app"] + sum(seconds or 0 for _, seconds in report["cold"])
+        self.stdout.write(self.style.SUCCESS(f"done. cold start total={total * 1000:.1f}ms"))
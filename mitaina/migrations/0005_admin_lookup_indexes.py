@@ -0,0 +1,54 @@
+# Generated by Django 4.2.28 on 2026-10-19 16:45
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+    # 大きなテーブルへの書き込みをロックしないよう CONCURRENTLY で作成する
+    atomic = False
+
+    dependencies = [
+        ('mitaina', '0004_post_collect_count_alter_reaction_reaction_type'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='notification',
+            index=models.Index(fields=['created_at'], name='notification_created_at_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='post',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['-created_at'], name='post_live_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='post',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('text'), name='text_pattern_ops'), name='post_text_upper_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='post',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('work_title'), name='text_pattern_ops'), name='post_work_title_upper_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='reaction',
+            index=models.Index(fields=['created_at'], name='reaction_created_at_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='report',
+            index=models.Index(fields=['created_at'], name='report_created_at_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='user',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('username'), name='text_pattern_ops'), name='user_username_upper_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='user',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('handle_name'), name='text_pattern_ops'), name='user_handle_upper_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='user',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('email'), name='text_pattern_ops'), name='user_email_upper_idx'),
+        ),
+    ]
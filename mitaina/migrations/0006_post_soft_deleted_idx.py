@@ -0,0 +1,19 @@
+# Generated by Django 4.2.28 on 2026-10-19 16:47
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('mitaina', '0005_admin_lookup_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='post',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['id'], name='post_soft_deleted_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.28 on 2026-10-19 16:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mitaina', '0009_event_log'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostSimilarityBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField()),
+                ('bucket', models.BigIntegerField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similarity_buckets', to='mitaina.post')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['band', 'bucket'], name='post_sim_band_bucket_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.28 on 2026-10-19 16:54
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+def backfill_report_counts(apps, schema_editor):
+    # 実行時の REPORT_AUTO_HIDE_THRESHOLD を使う（0 なら非表示にしない）
+    threshold = settings.REPORT_AUTO_HIDE_THRESHOLD
+    schema_editor.execute(
+        """
+        UPDATE mitaina_post AS p
+        SET report_count = r.cnt,
+            last_reported_at = r.last_at,
+            hidden_at = CASE WHEN %s > 0 AND r.cnt >= %s THEN now() ELSE p.hidden_at END
+        FROM (
+            SELECT post_id, COUNT(*) AS cnt, MAX(created_at) AS last_at
+            FROM mitaina_report
+            GROUP BY post_id
+        ) AS r
+        WHERE p.id = r.post_id
+        """,
+        [threshold, threshold],
+    )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('mitaina', '0011_follow_recommendation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='hidden_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='last_reported_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='report_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        # 既存の通報からカウンタを埋める（しきい値以上の投稿は非表示にする）
+        migrations.RunPython(backfill_report_counts, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='post',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True), ('report_count__gt', 0)), fields=['-report_count', '-last_reported_at'], name='post_moderation_queue_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.28 on 2026-10-19 17:07
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mitaina', '0012_post_report_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReactionSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mask', models.SmallIntegerField(default=0)),
+                ('like_at', models.DateTimeField(blank=True, null=True)),
+                ('hatena_at', models.DateTimeField(blank=True, null=True)),
+                ('correct_at', models.DateTimeField(blank=True, null=True)),
+                ('collect_at', models.DateTimeField(blank=True, null=True)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='mitaina.post')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='reactionset',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='reactionset_user_post_uniq'),
+        ),
+    ]
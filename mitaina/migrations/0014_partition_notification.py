@@ -0,0 +1,107 @@
+from django.db import migrations
+
+# mitaina_notification を created_at の月次レンジパーティションに作り直す
+# （既存行をコピーしてから入れ替える。モデルの状態は変わらない）
+#
+# - 主キーはパーティションキーを含める必要があるので (id, created_at)
+# - PostgreSQL 16 以前はパーティションテーブルに IDENTITY を付けられないのでシーケンスを使う
+# - 既存データの最初の月から3か月先までのパーティションと、念のための DEFAULT パーティションを作る
+#   （以降は manage_partitions コマンドで先の月を作る）
+FORWARD_SQL = """
+CREATE SEQUENCE mitaina_notification_new_id_seq;
+
+CREATE TABLE mitaina_notification_new (
+    id bigint NOT NULL DEFAULT nextval('mitaina_notification_new_id_seq'),
+    notification_type varchar(20) NOT NULL,
+    is_read boolean NOT NULL,
+    created_at timestamp with time zone NOT NULL,
+    actor_id bigint NOT NULL,
+    post_id bigint NULL,
+    user_id bigint NOT NULL
+) PARTITION BY RANGE (created_at);
+
+DO $$
+DECLARE
+    m date := date_trunc('month', COALESCE((SELECT MIN(created_at) FROM mitaina_notification), now()) AT TIME ZONE 'UTC');
+    last_month date := date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months';
+BEGIN
+    WHILE m <= last_month LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF mitaina_notification_new FOR VALUES FROM (%L) TO (%L)',
+            'mitaina_notification_p' || to_char(m, 'YYYY_MM'),
+            m::text || ' 00:00:00+00',
+            (m + interval '1 month')::date::text || ' 00:00:00+00'
+        );
+        m := m + interval '1 month';
+    END LOOP;
+END
+$$;
+
+CREATE TABLE mitaina_notification_default PARTITION OF mitaina_notification_new DEFAULT;
+
+INSERT INTO mitaina_notification_new (id, notification_type, is_read, created_at, actor_id, post_id, user_id)
+SELECT id, notification_type, is_read, created_at, actor_id, post_id, user_id FROM mitaina_notification;
+
+SELECT setval('mitaina_notification_new_id_seq', COALESCE((SELECT MAX(id) FROM mitaina_notification), 0) + 1, false);
+
+DROP TABLE mitaina_notification;
+ALTER TABLE mitaina_notification_new RENAME TO mitaina_notification;
+ALTER SEQUENCE mitaina_notification_new_id_seq RENAME TO mitaina_notification_id_seq;
+ALTER SEQUENCE mitaina_notification_id_seq OWNED BY mitaina_notification.id;
+
+ALTER TABLE mitaina_notification ADD CONSTRAINT mitaina_notification_pkey PRIMARY KEY (id, created_at);
+CREATE INDEX mitaina_notification_actor_id_f101159e ON mitaina_notification (actor_id);
+CREATE INDEX mitaina_notification_post_id_32584515 ON mitaina_notification (post_id);
+CREATE INDEX mitaina_notification_user_id_34d349b3 ON mitaina_notification (user_id);
+CREATE INDEX notification_created_at_idx ON mitaina_notification (created_at);
+ALTER TABLE mitaina_notification ADD CONSTRAINT mitaina_notification_actor_id_f101159e_fk_mitaina_user_id
+    FOREIGN KEY (actor_id) REFERENCES mitaina_user (id) DEFERRABLE INITIALLY DEFERRED;
+ALTER TABLE mitaina_notification ADD CONSTRAINT mitaina_notification_post_id_32584515_fk_mitaina_post_id
+    FOREIGN KEY (post_id) REFERENCES mitaina_post (id) DEFERRABLE INITIALLY DEFERRED;
+ALTER TABLE mitaina_notification ADD CONSTRAINT mitaina_notification_user_id_34d349b3_fk_mitaina_user_id
+    FOREIGN KEY (user_id) REFERENCES mitaina_user (id) DEFERRABLE INITIALLY DEFERRED;
+"""
+
+# 通常のテーブルに戻す
+REVERSE_SQL = """
+CREATE TABLE mitaina_notification_old (
+    id bigint NOT NULL GENERATED BY DEFAULT AS IDENTITY,
+    notification_type varchar(20) NOT NULL,
+    is_read boolean NOT NULL,
+    created_at timestamp with time zone NOT NULL,
+    actor_id bigint NOT NULL,
+    post_id bigint NULL,
+    user_id bigint NOT NULL
+);
+
+INSERT INTO mitaina_notification_old (id, notification_type, is_read, created_at, actor_id, post_id, user_id)
+SELECT id, notification_type, is_read, created_at, actor_id, post_id, user_id FROM mitaina_notification;
+
+SELECT setval(pg_get_serial_sequence('mitaina_notification_old', 'id'), COALESCE((SELECT MAX(id) FROM mitaina_notification), 0) + 1, false);
+
+DROP TABLE mitaina_notification;
+ALTER TABLE mitaina_notification_old RENAME TO mitaina_notification;
+
+ALTER TABLE mitaina_notification ADD CONSTRAINT mitaina_notification_pkey PRIMARY KEY (id);
+CREATE INDEX mitaina_notification_actor_id_f101159e ON mitaina_notification (actor_id);
+CREATE INDEX mitaina_notification_post_id_32584515 ON mitaina_notification (post_id);
+CREATE INDEX mitaina_notification_user_id_34d349b3 ON mitaina_notification (user_id);
+CREATE INDEX notification_created_at_idx ON mitaina_notification (created_at);
+ALTER TABLE mitaina_notification ADD CONSTRAINT mitaina_notification_actor_id_f101159e_fk_mitaina_user_id
+    FOREIGN KEY (actor_id) REFERENCES mitaina_user (id) DEFERRABLE INITIALLY DEFERRED;
+ALTER TABLE mitaina_notification ADD CONSTRAINT mitaina_notification_post_id_32584515_fk_mitaina_post_id
+    FOREIGN KEY (post_id) REFERENCES mitaina_post (id) DEFERRABLE INITIALLY DEFERRED;
+ALTER TABLE mitaina_notification ADD CONSTRAINT mitaina_notification_user_id_34d349b3_fk_mitaina_user_id
+    FOREIGN KEY (user_id) REFERENCES mitaina_user (id) DEFERRABLE INITIALLY DEFERRED;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mitaina', '0013_reaction_set'),
+    ]
+
+    operations = [
+        migrations.RunSQL(FORWARD_SQL, REVERSE_SQL),
+    ]
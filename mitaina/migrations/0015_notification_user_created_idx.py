@@ -0,0 +1,26 @@
+# Generated by Django 4.2.28 on 2026-10-19 17:13
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mitaina', '0014_partition_notification'),
+    ]
+
+    operations = [
+        # mitaina_notification はパーティションテーブルなので CONCURRENTLY は使えない
+        # 先に複合インデックスを作ってから user_id 単独のインデックスを消す
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', '-created_at'], name='notification_user_created_idx'),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.28 on 2026-10-19 17:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mitaina', '0016_post_view_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('post_count', models.PositiveIntegerField(default=0)),
+                ('like_received', models.PositiveIntegerField(default=0)),
+                ('hatena_received', models.PositiveIntegerField(default=0)),
+                ('correct_received', models.PositiveIntegerField(default=0)),
+                ('collect_received', models.PositiveIntegerField(default=0)),
+                ('reactions_given', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
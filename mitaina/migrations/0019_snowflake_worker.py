@@ -0,0 +1,21 @@
+# Generated by Django 4.2.28 on 2026-10-19 17:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mitaina', '0018_outbound_email'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnowflakeWorker',
+            fields=[
+                ('worker_id', models.PositiveSmallIntegerField(primary_key=True, serialize=False)),
+                ('owner', models.CharField(blank=True, default='', max_length=100)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
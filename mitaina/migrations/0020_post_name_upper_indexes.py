@@ -0,0 +1,26 @@
+# Generated by Django 4.2.28 on 2026-10-19 17:38
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+    # 大きなテーブルへの書き込みをロックしないよう CONCURRENTLY で作成する
+    atomic = False
+
+    dependencies = [
+        ('mitaina', '0019_snowflake_worker'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='post',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('performer_name'), name='text_pattern_ops'), name='post_performer_name_upper_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='post',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('character_name'), name='text_pattern_ops'), name='post_character_name_upper_idx'),
+        ),
+    ]
@@ -1,9 +1,13 @@
 # mitaina/models.py
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import OpClass
 from django.db import models
 from django.db.models import Q
+from django.db.models.functions import Upper
 from django.utils import timezone
 
+from .snowflake import assign_id
+
 
 class User(AbstractUser):
     # 表示名
@@ -11,6 +15,16 @@ class User(AbstractUser):
     # username は public_id（@なしで保存、表示はフロントで @ を付ける）
     # email は一旦ユニークにしておく（後で必要になった時に使える）
     email = models.EmailField(unique=True)
+    # 退会リクエスト日時（セットされたユーザーはバックグラウンドで削除される）
+    deletion_requested_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # admin の前方一致検索（istartswith）用
+            models.Index(OpClass(Upper("username"), name="text_pattern_ops"), name="user_username_upper_idx"),
+            models.Index(OpClass(Upper("handle_name"), name="text_pattern_ops"), name="user_handle_upper_idx"),
+            models.Index(OpClass(Upper("email"), name="text_pattern_ops"), name="user_email_upper_idx"),
+        ]
 
 
 class Post(models.Model):
@@ -36,12 +50,44 @@ class Post(models.Model):
     hatena_count = models.PositiveIntegerField(default=0)
     correct_count = models.PositiveIntegerField(default=0)
     collect_count = models.PositiveIntegerField(default=0)
+    # ユニーク閲覧者数の推定値（PostViewSketch から impressions.apply_sketches が書く）
+    view_count = models.PositiveIntegerField(default=0)
+    report_count = models.PositiveIntegerField(default=0)
+    last_reported_at = models.DateTimeField(null=True, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
     deleted_at = models.DateTimeField(null=True, blank=True)  # 論理削除
+    hidden_at = models.DateTimeField(null=True, blank=True)  # 通報数による自動非表示
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # 公開一覧（deleted_at IS NULL ORDER BY created_at DESC）用
+            models.Index(fields=["-created_at"], condition=Q(deleted_at__isnull=True), name="post_live_created_idx"),
+            # admin の前方一致検索用
+            models.Index(OpClass(Upper("text"), name="text_pattern_ops"), name="post_text_upper_idx"),
+            models.Index(OpClass(Upper("work_title"), name="text_pattern_ops"), name="post_work_title_upper_idx"),
+            models.Index(
+                OpClass(Upper("performer_name"), name="text_pattern_ops"), name="post_performer_name_upper_idx"
+            ),
+            models.Index(
+                OpClass(Upper("character_name"), name="text_pattern_ops"), name="post_character_name_upper_idx"
+            ),
+            # 論理削除済み投稿の物理削除（purge_deleted）用
+            models.Index(fields=["id"], condition=Q(deleted_at__isnull=False), name="post_soft_deleted_idx"),
+            # モデレーションキュー（通報数・最終通報日時の降順）用
+            models.Index(
+                fields=["-report_count", "-last_reported_at"],
+                condition=Q(report_count__gt=0, deleted_at__isnull=True),
+                name="post_moderation_queue_idx",
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        # SNOWFLAKE_IDS が有効なら時刻順の ID を振る
+        if assign_id(self):
+            kwargs["force_insert"] = True
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.author.handle_name}: {self.text[:50]}"
@@ -64,11 +110,45 @@ class Reaction(models.Model):
     class Meta:
         unique_together = ("user", "post", "reaction_type")
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["created_at"], name="reaction_created_at_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        # SNOWFLAKE_IDS が有効なら時刻順の ID を振る
+        if assign_id(self):
+            kwargs["force_insert"] = True
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.user.handle_name} - {self.reaction_type} on {self.post.id}"
 
 
+class ReactionSet(models.Model):
+    """
+    (ユーザー, 投稿) ごとのリアクションをビットマスク1行で持つ（REACTION_STORAGE=bitmask 用）
+
+    mask のビットは mitaina.reactions.REACTION_BITS。<type>_at はそのビットが
+    立っているときだけ値を持つ（タイプ別一覧の並び順に使う）
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+", db_index=False)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="+")
+    mask = models.SmallIntegerField(default=0)
+    like_at = models.DateTimeField(null=True, blank=True)
+    hatena_at = models.DateTimeField(null=True, blank=True)
+    correct_at = models.DateTimeField(null=True, blank=True)
+    collect_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # user 単体の検索もこの一意制約のインデックスで引ける
+        constraints = [
+            models.UniqueConstraint(fields=["user", "post"], name="reactionset_user_post_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.mask:#06b} on {self.post_id}"
+
+
 class Follow(models.Model):
     """フォローモデル"""
     follower = models.ForeignKey(
@@ -105,7 +185,8 @@ class Notification(models.Model):
         ("followed", "followed"),
     ]
 
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="notifications")
+    # user 単独のインデックスは notification_user_created_idx で足りる
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="notifications", db_index=False)
     actor = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="notifications_created"
     )
@@ -118,6 +199,11 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["created_at"], name="notification_created_at_idx"),
+            # 自分の通知一覧（新しい順）と保持件数を超えた分の削除
+            models.Index(fields=["user", "-created_at"], name="notification_user_created_idx"),
+        ]
 
     def __str__(self):
         return f"{self.actor.handle_name} {self.notification_type} to {self.user.handle_name}"
@@ -141,6 +227,176 @@ class Report(models.Model):
     class Meta:
         unique_together = ("reporter", "post")
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["created_at"], name="report_created_at_idx"),
+        ]
+
+    def __str__(self):
+        return f"Report: {self.reason} on {self.post.id}"
+
+class PostSimilarityBucket(models.Model):
+    """投稿テキストの MinHash/LSH バケット（類似投稿検索用）"""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="similarity_buckets")
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["band", "bucket"], name="post_sim_band_bucket_idx"),
+        ]
+
+    def __str__(self):
+        return f"Bucket {self.band}:{self.bucket} -> {self.post_id}"
+
+
+class UserStats(models.Model):
+    """ユーザーごとの集計（プロフィール表示用のカウンタキャッシュ。user_stats を参照）"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+    post_count = models.PositiveIntegerField(default=0)
+    # 公開中（論理削除されていない）の自分の投稿が受けたリアクション数
+    like_received = models.PositiveIntegerField(default=0)
+    hatena_received = models.PositiveIntegerField(default=0)
+    correct_received = models.PositiveIntegerField(default=0)
+    collect_received = models.PositiveIntegerField(default=0)
+    reactions_given = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Stats for {self.user_id}"
+
+
+class PostViewSketch(models.Model):
+    """投稿の閲覧者の HyperLogLog スケッチ（impressions を参照）"""
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name="+")
+    registers = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"View sketch for {self.post_id}"
+
+
+class FollowRecommendation(models.Model):
+    """おすすめユーザー候補（バッチで事前計算）"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="recommendations")
+    candidate = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    score = models.FloatField()
+    # フォロー中のユーザーのうち候補をフォローしている人数
+    mutual_count = models.PositiveIntegerField(default=0)
+    # 両者がリアクションした work_title の数
+    shared_work_count = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("user", "candidate")
+        indexes = [
+            models.Index(fields=["user", "-score"], name="follow_rec_user_score_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.candidate_id} ({self.score})"
+
+
+class Job(models.Model):
+    """バックグラウンドジョブ（PostgreSQL 上のキュー）"""
+    STATUS_CHOICES = [
+        ("pending", "pending"),
+        ("running", "running"),
+        ("failed", "failed"),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    # 次に実行可能になる日時（実行中は可視性タイムアウトの期限）
+    run_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["run_at", "id"]
+        indexes = [
+            # ワーカーの取得クエリ（未完了 AND run_at <= now ORDER BY run_at）用
+            models.Index(
+                fields=["run_at", "id"],
+                condition=Q(status__in=["pending", "running"]),
+                name="job_runnable_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Job {self.id}: {self.name} ({self.status})"
+
+
+class OutboundEmail(models.Model):
+    """送信待ちのメール（mail.OutboxEmailBackend が書き、send_outbox が送る）"""
+    STATUS_CHOICES = [
+        ("pending", "pending"),
+        ("sending", "sending"),
+        ("failed", "failed"),
+    ]
+
+    from_email = models.CharField(max_length=320)
+    recipients = models.JSONField(default=list)  # to + cc + bcc
+    message = models.BinaryField()  # 送信する MIME メッセージそのもの
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    # 次に送信できる日時（送信中は可視性タイムアウトの期限）
+    run_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["run_at", "id"],
+                condition=Q(status__in=["pending", "sending"]),
+                name="outbound_email_runnable_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Email {self.id} to {', '.join(self.recipients)} ({self.status})"
+
+
+class Event(models.Model):
+    """変更イベントログ（追記のみ・変更と同じトランザクションで書く）"""
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    # 書き込んだトランザクションの ID（txid_current()）。コンシューマが
+    # 未コミットのトランザクションを追い越さないために使う
+    txid = models.BigIntegerField(editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["txid", "id"], name="event_txid_id_idx"),
+        ]
+
+    def __str__(self):
+        return f"Event {self.id}: {self.kind}"
+
+
+class EventCheckpoint(models.Model):
+    """イベントコンシューマごとの読み取り位置"""
+    name = models.CharField(max_length=100, primary_key=True)
+    last_txid = models.BigIntegerField(default=0)
+    last_event_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_event_id}"
+
+
+class SnowflakeWorker(models.Model):
+    """Snowflake のワーカー ID の貸し出し（プロセスごとに期限つきで借りる。snowflake.py）"""
+    worker_id = models.PositiveSmallIntegerField(primary_key=True)
+    owner = models.CharField(max_length=100, blank=True, default="")
+    # この時刻を過ぎたら他のプロセスが借りられる（None は空き）
+    expires_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
-        return f"Report: {self.reason} on {self.post.id}"
\ No newline at end of file
+        return f"worker {self.worker_id}: {self.owner or '-'}"
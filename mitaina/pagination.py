@@ -0,0 +1,97 @@
+"""件数推定つきページネーション"""
+import hashlib
+import json
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import PageNumberPagination
+
+
+def _planner_estimate(queryset):
+    """EXPLAIN の推定行数を返す（PostgreSQL 以外は None）"""
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def estimated_count(queryset, estimate=False):
+    """
+    件数を返す。estimate=True でしきい値を超える場合は planner の推定値を使う
+
+    正確な COUNT(*) は全件スキャンになるため、大きなテーブルの絞り込みのない一覧
+    （estimate=True）では EXPLAIN の推定行数で代用する。検索や絞り込みがあると
+    推定が桁違いにずれる（存在しないページへの next・あるページの 404）ので、
+    その場合は呼び出し元が estimate=False のまま正確に数える。
+    結果は短時間キャッシュする。空になるのが明らかなクエリ（.none() や空の __in）は 0
+    """
+    queryset = queryset.order_by()
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+    digest = hashlib.sha1(f"{queryset.db}:{estimate}:{sql}:{params!r}".encode()).hexdigest()
+    key = f"pagination:count:{digest}"
+
+    count = cache.get(key)
+    if count is not None:
+        return count
+
+    planned = _planner_estimate(queryset) if estimate else None
+    if planned is not None and planned > settings.ESTIMATED_COUNT_THRESHOLD:
+        count = planned
+    else:
+        count = queryset.count()
+    cache.set(key, count, settings.ESTIMATED_COUNT_CACHE_SECONDS)
+    return count
+
+
+class EstimatedCountPaginator(Paginator):
+    """count に推定値を使える Paginator（estimate=True のときだけ推定する。admin の changelist でも使用）"""
+
+    def __init__(self, *args, estimate=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.estimate = estimate
+
+    @cached_property
+    def count(self):
+        if hasattr(self.object_list, "query"):
+            return estimated_count(self.object_list, estimate=self.estimate)
+        return len(self.object_list)
+
+
+def is_unfiltered(queryset, base_queryset):
+    """queryset の WHERE が base_queryset（ビューの get_queryset()）と同じか（検索・絞り込みなし）"""
+    return queryset.model is base_queryset.model and queryset.query.where == base_queryset.query.where
+
+
+class EstimatedCountPageNumberPagination(PageNumberPagination):
+    """
+    件数推定つき PageNumberPagination
+
+    ビューの estimated_count が True で、検索・絞り込みのない（get_queryset() のままの）
+    一覧のときだけ件数を推定する。それ以外は COUNT(*)
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        estimate = (
+            getattr(view, "estimated_count", False)
+            and hasattr(queryset, "query")
+            and is_unfiltered(queryset, view.get_queryset())
+        )
+        self.django_paginator_class = partial(EstimatedCountPaginator, estimate=estimate)
+        return super().paginate_queryset(queryset, request, view)
@@ -0,0 +1,162 @@
+"""
+月次レンジパーティションの管理（PostgreSQL の宣言的パーティショニング）
+
+パーティション名は <テーブル>_pYYYY_MM、範囲は UTC の月初から翌月初まで。
+古い月は DELETE せずにパーティションごと切り離して削除する。
+
+Post と Reaction は対象外:
+- Post は他テーブルの FK の参照先で、パーティションテーブルの一意キーには
+  パーティションキー（created_at）を含める必要があるため post(id) を参照できなくなる
+- Reaction の (user, post, reaction_type) の一意性も created_at を含めないと保証できない
+"""
+import re
+from datetime import date
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Notification
+
+# パーティション化済みのテーブル → パーティションキー
+PARTITIONED_TABLES = {
+    Notification._meta.db_table: "created_at",
+}
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, n):
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y_%m}"
+
+
+def _check_table(table):
+    if table not in PARTITIONED_TABLES:
+        raise ValueError(f"{table} is not a partitioned table")
+
+
+def list_partitions(table):
+    """[(月, パーティション名)]（古い順。DEFAULT パーティションは含まない）"""
+    _check_table(table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = %s::regclass
+            """,
+            [table],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    pattern = re.compile(rf"^{re.escape(table)}_p(\d{{4}})_(\d{{2}})$")
+    partitions = []
+    for name in names:
+        match = pattern.match(name)
+        if match:
+            partitions.append((date(int(match[1]), int(match[2]), 1), name))
+    return sorted(partitions)
+
+
+def default_partition_rows(table):
+    """DEFAULT パーティションの行数（月のパーティションが足りないと増える）"""
+    _check_table(table)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT COUNT(*) FROM "{table}_default"')
+        return cursor.fetchone()[0]
+
+
+def _default_partition_months(table):
+    """DEFAULT パーティションに行がある月（古い順）"""
+    key = PARTITIONED_TABLES[table]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT DISTINCT date_trunc(\'month\', "{key}" AT TIME ZONE \'UTC\')::date '
+            f'FROM "{table}_default" ORDER BY 1'
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _columns(cursor, table):
+    cursor.execute(
+        """
+        SELECT attname FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+        ORDER BY attnum
+        """,
+        [table],
+    )
+    return ", ".join(f'"{row[0]}"' for row in cursor.fetchall())
+
+
+def _create_partition(table, month, move_default_rows):
+    """
+    month のパーティションを作る
+
+    DEFAULT にその月の行があると CREATE TABLE ... PARTITION OF が失敗するので、
+    1トランザクションで DEFAULT を切り離し、パーティションを作って行を移し、付け直す
+    （その間はテーブルを排他ロックするので、行が多いときは書き込みが止まる）
+    """
+    name = partition_name(table, month)
+    bounds = [f"{month} 00:00:00+00", f"{add_months(month, 1)} 00:00:00+00"]
+    create = f'CREATE TABLE "{name}" PARTITION OF "{table}" FOR VALUES FROM (%s) TO (%s)'
+    if not move_default_rows:
+        with connection.cursor() as cursor:
+            cursor.execute(create, bounds)
+        return name
+
+    key = PARTITIONED_TABLES[table]
+    default = f"{table}_default"
+    with transaction.atomic(), connection.cursor() as cursor:
+        columns = _columns(cursor, table)
+        cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{default}"')
+        cursor.execute(create, bounds)
+        cursor.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM "{default}" WHERE "{key}" >= %s AND "{key}" < %s RETURNING {columns}
+            )
+            INSERT INTO "{table}" ({columns}) SELECT {columns} FROM moved
+            """,
+            bounds,
+        )
+        cursor.execute(f'ALTER TABLE "{table}" ATTACH PARTITION "{default}" DEFAULT')
+    return name
+
+
+def ensure_partitions(table, months_ahead=3):
+    """
+    今月から months_ahead か月先までと、DEFAULT に行が入っている月のパーティションを作る
+    （DEFAULT の行は作ったパーティションへ移す。作ったものの名前を返す）
+    """
+    _check_table(table)
+    existing = {month for month, _ in list_partitions(table)}
+    current = month_start(timezone.now())  # USE_TZ なので UTC
+    in_default = set(_default_partition_months(table))
+    months = {add_months(current, n) for n in range(months_ahead + 1)} | in_default
+    created = []
+    for month in sorted(months - existing):
+        created.append(_create_partition(table, month, move_default_rows=month in in_default))
+    return created
+
+
+def drop_partitions_before(table, cutoff_month, detach_only=False):
+    """cutoff_month より前の月のパーティションを切り離す（detach_only でなければ削除も）"""
+    _check_table(table)
+    removed = []
+    for month, name in list_partitions(table):
+        if month >= cutoff_month:
+            break
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"')
+            if not detach_only:
+                cursor.execute(f'DROP TABLE "{name}"')
+        removed.append(name)
+    return removed
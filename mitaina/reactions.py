@@ -0,0 +1,128 @@
+"""
+リアクションの保存形式
+
+REACTION_STORAGE=rows    … Reaction に (ユーザー, 投稿, タイプ) ごとに1行（従来）
+REACTION_STORAGE=bitmask … ReactionSet に (ユーザー, 投稿) ごとに1行、タイプはビットで持つ
+
+切り替えは convert_reactions コマンドで変換してから行うこと。
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Reaction, ReactionSet
+
+REACTION_BITS = {"like": 1, "hatena": 2, "correct": 4, "collect": 8}
+
+
+def bitmask_enabled():
+    return settings.REACTION_STORAGE == "bitmask"
+
+
+def storage_model():
+    """現在の保存形式のモデル（Reaction または ReactionSet）"""
+    return ReactionSet if bitmask_enabled() else Reaction
+
+
+def types_from_mask(mask):
+    """ビットマスク → タイプ名のリスト"""
+    return [t for t, bit in REACTION_BITS.items() if mask & bit]
+
+
+_TOGGLE_SQL = """
+INSERT INTO {table} (user_id, post_id, mask, {column})
+VALUES (%s, %s, %s, %s)
+ON CONFLICT (user_id, post_id) DO UPDATE SET
+    mask = {table}.mask # EXCLUDED.mask,
+    {column} = CASE WHEN {table}.mask & EXCLUDED.mask = 0 THEN EXCLUDED.{column} END
+RETURNING id, mask
+"""
+
+
+def _toggle_bitmask(user_id, post_id, reaction_type):
+    bit = REACTION_BITS[reaction_type]
+    table = ReactionSet._meta.db_table
+    with connection.cursor() as cursor:
+        # 付け外しを1文で（既存行のビットを XOR で反転）
+        cursor.execute(
+            _TOGGLE_SQL.format(table=table, column=f"{reaction_type}_at"),
+            [user_id, post_id, bit, timezone.now()],
+        )
+        row_id, mask = cursor.fetchone()
+    if mask == 0:
+        # 最後のリアクションを外したら行ごと消す
+        ReactionSet.objects.filter(pk=row_id, mask=0).delete()
+    return bool(mask & bit)
+
+
+def toggle(user_id, post_id, reaction_type):
+    """
+    リアクションを付け外しする
+
+    Returns:
+        bool: 付けた場合 True、外した場合 False
+    """
+    if bitmask_enabled():
+        return _toggle_bitmask(user_id, post_id, reaction_type)
+
+    deleted, _ = Reaction.objects.filter(
+        user_id=user_id, post_id=post_id, reaction_type=reaction_type
+    ).delete()
+    if deleted:
+        return False
+    Reaction.objects.create(user_id=user_id, post_id=post_id, reaction_type=reaction_type)
+    return True
+
+
+def reacted(user, reaction_type):
+    """
+    user が reaction_type を付けたリアクションを新しい順に（各要素は .post を持つ）
+    """
+    if bitmask_enabled():
+        column = f"{reaction_type}_at"
+        return ReactionSet.objects.filter(
+            user=user, **{f"{column}__isnull": False}
+        ).order_by(F(column).desc(), "-id")
+    return Reaction.objects.filter(user=user, reaction_type=reaction_type).order_by("-created_at")
+
+
+def reaction_states(user_id, post_ids):
+    """{post_id: [付けているタイプ]}（リアクションのない投稿は含まない）"""
+    if bitmask_enabled():
+        rows = ReactionSet.objects.filter(user_id=user_id, post_id__in=post_ids).values_list(
+            "post_id", "mask"
+        )
+        return {post_id: types_from_mask(mask) for post_id, mask in rows}
+
+    states = {}
+    rows = Reaction.objects.filter(user_id=user_id, post_id__in=post_ids).values_list(
+        "post_id", "reaction_type"
+    )
+    for post_id, reaction_type in rows:
+        states.setdefault(post_id, []).append(reaction_type)
+    return states
+
+
+def reaction_set_since(since):
+    """since 以降に付いたリアクションを含む ReactionSet の条件"""
+    condition = Q()
+    for reaction_type in REACTION_BITS:
+        condition |= Q(**{f"{reaction_type}_at__gte": since})
+    return condition
+
+
+def expand_reaction_sets(rows, since=None):
+    """ReactionSet の values 行を Reaction と同じ形（タイプごとに1行）に展開する"""
+    for row in rows:
+        for reaction_type in types_from_mask(row["mask"]):
+            created_at = row[f"{reaction_type}_at"]
+            if since is not None and created_at < since:
+                continue
+            yield {
+                "id": row["id"],
+                "user_id": row["user_id"],
+                "post_id": row["post_id"],
+                "reaction_type": reaction_type,
+                "created_at": created_at,
+            }
@@ -0,0 +1,129 @@
+"""おすすめユーザー（フォローグラフの 2-hop 候補）の事前計算"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef
+
+from .events import consume
+from .models import User, Follow, FollowRecommendation
+from .reactions import storage_model
+
+# 作品の重み付けに使う候補の上限（共通フォロー数の多い順）
+MAX_CANDIDATES_PER_USER = 200
+
+
+def _two_hop_counts(user_ids):
+    """
+    {user_id: {candidate_id: 共通フォロー数}} を1クエリで求める
+
+    f2 (X -> candidate) を起点に、X をフォローしている f1 (user -> X) を結合する
+    """
+    viewer = "follower__followers_list__follower_id"
+    already_following = Follow.objects.filter(
+        follower_id=OuterRef(viewer),
+        following_id=OuterRef("following_id"),
+    )
+    rows = (
+        Follow.objects.filter(**{f"{viewer}__in": user_ids}, following__is_active=True)
+        .exclude(following_id=F(viewer))
+        .exclude(Exists(already_following))
+        .values_list(viewer, "following_id")
+        .annotate(mutual=Count("id"))
+    )
+    counts = defaultdict(dict)
+    for user_id, candidate_id, mutual in rows:
+        counts[user_id][candidate_id] = mutual
+    return counts
+
+
+def _work_titles(user_ids):
+    """{user_id: リアクションした work_title の集合}"""
+    titles = defaultdict(set)
+    rows = (
+        storage_model().objects.filter(user_id__in=user_ids, post__work_title__gt="")
+        .values_list("user_id", "post__work_title")
+        .distinct()
+    )
+    for user_id, work_title in rows:
+        titles[user_id].add(work_title)
+    return titles
+
+
+def rebuild_for_users(user_ids):
+    """指定ユーザーの候補を計算し直して保存する"""
+    user_ids = list(user_ids)
+    counts = _two_hop_counts(user_ids)
+
+    candidates_by_user = {}
+    for user_id, mutuals in counts.items():
+        top = sorted(mutuals.items(), key=lambda kv: kv[1], reverse=True)
+        candidates_by_user[user_id] = dict(top[:MAX_CANDIDATES_PER_USER])
+
+    involved = set(user_ids)
+    for mutuals in candidates_by_user.values():
+        involved.update(mutuals)
+    titles = _work_titles(involved)
+
+    weight = settings.RECOMMENDATION_WORK_WEIGHT
+    rows = []
+    for user_id, mutuals in candidates_by_user.items():
+        scored = []
+        for candidate_id, mutual in mutuals.items():
+            shared = len(titles[user_id] & titles[candidate_id])
+            scored.append((mutual + weight * shared, candidate_id, mutual, shared))
+        scored.sort(reverse=True)
+        rows.extend(
+            FollowRecommendation(
+                user_id=user_id,
+                candidate_id=candidate_id,
+                score=score,
+                mutual_count=mutual,
+                shared_work_count=shared,
+            )
+            for score, candidate_id, mutual, shared in scored[: settings.RECOMMENDATION_LIMIT]
+        )
+
+    with transaction.atomic():
+        FollowRecommendation.objects.filter(user_id__in=user_ids).delete()
+        FollowRecommendation.objects.bulk_create(rows)
+    return len(rows)
+
+
+def rebuild_all(batch_size=500):
+    """全ユーザーの候補を計算し直す"""
+    total = 0
+    last_id = 0
+    while True:
+        user_ids = list(
+            User.objects.filter(id__gt=last_id, is_active=True)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not user_ids:
+            break
+        total += rebuild_for_users(user_ids)
+        last_id = user_ids[-1]
+    return total
+
+
+def refresh_changed(batch_size=1000):
+    """
+    前回以降にフォローが変わったユーザーの候補だけ計算し直す（イベントログから）
+
+    X のフォローが変わると、X 自身と X をフォローしている人の 2-hop が変わる
+    """
+    def handle(events):
+        changed = {e.payload["follower_id"] for e in events}
+        affected = set(changed)
+        affected.update(
+            Follow.objects.filter(following_id__in=changed).values_list("follower_id", flat=True)
+        )
+        rebuild_for_users(affected)
+
+    return consume(
+        "recommendations",
+        handle,
+        batch_size=batch_size,
+        kinds=["follow.added", "follow.removed"],
+    )
@@ -1,7 +1,105 @@
+from django.core.exceptions import FieldDoesNotExist, ObjectDoesNotExist
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from .models import User, Post, Reaction, Follow, Notification, Report
 
 
+def _query_param_set(request, name):
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    return {v.strip() for v in value.split(",") if v.strip()}
+
+
+def is_compact(request):
+    """?compact=1 が指定されているか"""
+    return request is not None and request.query_params.get("compact") == "1"
+
+
+def returns_field(request, name):
+    """?fields= の指定で name を返すか（?fields= がなければ True）"""
+    fields = _query_param_set(request, "fields") if request is not None else None
+    return fields is None or name in fields
+
+
+def _only_columns(serializer, prefix=""):
+    """シリアライザーの出力に必要なカラムと select_related するパスを返す"""
+    model = serializer.Meta.model
+    columns = [prefix + model._meta.pk.name]
+    related = []
+    method_sources = getattr(serializer, "method_field_sources", {})
+    for name, field in serializer.fields.items():
+        if name in method_sources:
+            columns.extend(prefix + source for source in method_sources[name])
+        elif isinstance(field, serializers.BaseSerializer):
+            path = prefix + field.source
+            related.append(path)
+            nested_columns, nested_related = _only_columns(field, f"{path}__")
+            columns.extend(nested_columns)
+            related.extend(nested_related)
+        elif field.source != "*":
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                continue  # annotate した値など
+            if model_field.concrete:
+                columns.append(prefix + field.source)
+    return columns, related
+
+
+class SparseFieldsMixin:
+    """
+    GET の ?fields= / ?expand= / ?compact=1 で返すフィールドを絞る
+
+    - ?fields=id,text,author  指定したフィールドだけ返す。入れ子のオブジェクト
+      （expandable_fields）は ID になる
+    - ?expand=author          ?fields= 指定時も入れ子のオブジェクトを展開する
+    - ?compact=1              compact_fields を ID にする（投稿者はビュー側で
+      authors にまとめて返す）
+
+    どれも指定しなければ従来どおりすべて返す。
+    context の request を見るので、ビューから呼ぶときは context を渡すこと。
+    """
+    expandable_fields = ()
+    compact_fields = ()
+    # SerializerMethodField が読むカラム（.only() 用）
+    method_field_sources = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._sparse = False
+        request = self.context.get("request")
+        if request is None or request.method not in SAFE_METHODS:
+            return
+
+        fields = _query_param_set(request, "fields")
+        expand = _query_param_set(request, "expand") or set()
+        if fields is not None:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+            collapse = self.expandable_fields
+        elif is_compact(request):
+            collapse = self.compact_fields
+        else:
+            return
+
+        self._sparse = True
+        for name in collapse:
+            if name in self.fields and name not in expand:
+                self.fields[name] = serializers.PrimaryKeyRelatedField(read_only=True)
+
+    def trim_queryset(self, queryset):
+        """返すフィールドに合わせて .only() / select_related を絞る"""
+        if not self._sparse:
+            return queryset
+        columns, related = _only_columns(self)
+        queryset = queryset.select_related(None)
+        if related:
+            # 引数なしの select_related() は全 FK を結合してしまう
+            queryset = queryset.select_related(*related)
+        return queryset.only(*columns)
+
+
 class RegisterSerializer(serializers.ModelSerializer):
     """登録シリアライザー（handle_name を含める）"""
     password1 = serializers.CharField(write_only=True)
@@ -23,16 +121,48 @@ class RegisterSerializer(serializers.ModelSerializer):
         return user
 
 
+def user_stats_data(user):
+    """
+    プロフィール用の集計（select_related("stats") で読み込み済みのときだけ。なければ None）
+
+    シリアライズ中にユーザーごとのクエリを発行しないよう、読み込んでいなければ返さない。
+    行がまだない（reconcile_user_stats 前の）ユーザーも None
+    """
+    if not User.stats.is_cached(user):
+        return None
+    try:
+        stats = user.stats
+    except ObjectDoesNotExist:
+        return None
+    return {
+        "posts": stats.post_count,
+        "like_received": stats.like_received,
+        "hatena_received": stats.hatena_received,
+        "correct_received": stats.correct_received,
+        "collect_received": stats.collect_received,
+        "reactions_given": stats.reactions_given,
+    }
+
+
 class UserPublicSerializer(serializers.ModelSerializer):
     """ユーザーの公開情報シリアライザー"""
     public_id = serializers.CharField(source="username", read_only=True)
     following_count = serializers.IntegerField(read_only=True, default=0)
     followers_count = serializers.IntegerField(read_only=True, default=0)
-    is_followed = serializers.BooleanField(read_only=True, default=False)
+    is_followed = serializers.SerializerMethodField()
+    stats = serializers.SerializerMethodField()
 
     class Meta:
         model = User
-        fields = ("id", "public_id", "handle_name", "following_count", "followers_count", "is_followed")
+        fields = ("id", "public_id", "handle_name", "following_count", "followers_count", "is_followed", "stats")
+
+    def get_is_followed(self, obj):
+        """閲覧者がフォローしているか（context の following_ids で判定。なければ False）"""
+        following = self.context.get("following_ids")
+        return following is not None and obj.pk in following
+
+    def get_stats(self, obj):
+        return user_stats_data(obj)
 
 
 class UserDetailSerializer(serializers.ModelSerializer):
@@ -40,12 +170,16 @@ class UserDetailSerializer(serializers.ModelSerializer):
     public_id = serializers.CharField(source="username")
     following_count = serializers.IntegerField(read_only=True, default=0)
     followers_count = serializers.IntegerField(read_only=True, default=0)
+    stats = serializers.SerializerMethodField()
 
     class Meta:
         model = User
-        fields = ("id", "public_id", "handle_name", "email", "following_count", "followers_count")
+        fields = ("id", "public_id", "handle_name", "email", "following_count", "followers_count", "stats")
         read_only_fields = ("id",)
 
+    def get_stats(self, obj):
+        return user_stats_data(obj)
+
     def validate_public_id(self, value):
         """public_id（username）のバリデーション"""
         import re
@@ -74,11 +208,15 @@ class UserDetailSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """投稿シリアライザー"""
     author = UserPublicSerializer(read_only=True)
     reaction_counts = serializers.SerializerMethodField()
 
+    expandable_fields = ("author",)
+    compact_fields = ("author",)
+    method_field_sources = {"reaction_counts": ("like_count", "hatena_count", "correct_count")}
+
     class Meta:
         model = Post
         fields = (
@@ -93,9 +231,12 @@ class PostSerializer(serializers.ModelSerializer):
             "hatena_count",
             "correct_count",
             "reaction_counts",
+            "view_count",
             "created_at",
         )
-        read_only_fields = ("id", "author", "like_count", "hatena_count", "correct_count", "created_at")
+        read_only_fields = (
+            "id", "author", "like_count", "hatena_count", "correct_count", "view_count", "created_at"
+        )
 
     def validate_text(self, value):
         """テキストが141文字以内か検証"""
@@ -114,6 +255,21 @@ class PostSerializer(serializers.ModelSerializer):
         }
 
 
+class SimilarPostSerializer(PostSerializer):
+    """類似投稿シリアライザー（類似度つき）"""
+    similarity = serializers.FloatField(read_only=True)
+
+    class Meta(PostSerializer.Meta):
+        fields = PostSerializer.Meta.fields + ("similarity",)
+
+
+class ModerationPostSerializer(PostSerializer):
+    """モデレーション用投稿シリアライザー（通報数つき）"""
+
+    class Meta(PostSerializer.Meta):
+        fields = PostSerializer.Meta.fields + ("report_count", "last_reported_at", "hidden_at")
+
+
 class ReactionToggleSerializer(serializers.Serializer):
     """リアクション切り替えシリアライザー"""
     reaction_type = serializers.ChoiceField(choices=["like", "hatena", "correct"])
@@ -149,22 +305,26 @@ class ReportSerializer(serializers.ModelSerializer):
         return value
 
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """通知シリアライザー"""
     actor = UserPublicSerializer(read_only=True)
     post = PostSerializer(read_only=True)
 
+    expandable_fields = ("actor", "post")
+
     class Meta:
         model = Notification
         fields = ("id", "actor", "notification_type", "post", "is_read", "created_at")
         read_only_fields = ("id", "actor", "notification_type", "post", "created_at")
 
 
-class FollowSerializer(serializers.ModelSerializer):
+class FollowSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """フォロー/フォロワーシリアライザー"""
     follower = UserPublicSerializer(read_only=True)
     following = UserPublicSerializer(read_only=True)
 
+    expandable_fields = ("follower", "following")
+
     class Meta:
         model = Follow
         fields = ("id", "follower", "following", "created_at")
@@ -1,9 +1,75 @@
 """ビジネスロジックサービス"""
+from django.conf import settings
 from django.db import transaction
-from django.db.models import F
-from .models import Reaction, Notification, Follow, Post
+from django.db.models import F, Q, Case, When, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from .models import User, Notification, Follow, Post, Report
+from . import coalesce, follow_cache, reactions, user_stats
+from .jobs import enqueue, job_handler
+from .events import record_event
+from .similarity import index_posts
 
+# リアクションタイプ → Post のカウンタキャッシュ列
+REACTION_COUNTER_FIELDS = {
+    "like": "like_count",
+    "hatena": "hatena_count",
+    "correct": "correct_count",
+    "collect": "collect_count",
+}
 
+
+def create_notification(user_id, actor_id, notification_type, post_id=None):
+    """
+    通知を作成（重複は作らない）
+
+    ASYNC_SIDE_EFFECTS が有効ならジョブキューに積み、ワーカーがまとめて作成する
+    """
+    payload = {
+        "user_id": user_id,
+        "actor_id": actor_id,
+        "notification_type": notification_type,
+        "post_id": post_id,
+    }
+    if settings.ASYNC_SIDE_EFFECTS:
+        enqueue("notifications.create", payload)
+    else:
+        Notification.objects.get_or_create(**payload)
+
+
+@job_handler("notifications.create")
+def create_notifications_batch(payloads):
+    """通知作成ジョブのバッチハンドラ（既存・重複を除いて bulk_create）"""
+    keys = {
+        (p["user_id"], p["actor_id"], p["notification_type"], p.get("post_id"))
+        for p in payloads
+    }
+    lookup = Q()
+    for user_id, actor_id, notification_type, post_id in keys:
+        lookup |= Q(
+            user_id=user_id,
+            actor_id=actor_id,
+            notification_type=notification_type,
+            post_id=post_id,
+        )
+    existing = set(
+        Notification.objects.filter(lookup).values_list(
+            "user_id", "actor_id", "notification_type", "post_id"
+        )
+    )
+    Notification.objects.bulk_create([
+        Notification(
+            user_id=user_id,
+            actor_id=actor_id,
+            notification_type=notification_type,
+            post_id=post_id,
+        )
+        for user_id, actor_id, notification_type, post_id in keys - existing
+    ])
+
+
+@transaction.atomic
 def toggle_reaction(user, post, reaction_type):
     """
     リアクション のトグル（追加/削除）
@@ -14,55 +80,55 @@ def toggle_reaction(user, post, reaction_type):
         reaction_type: リアクションタイプ ('like', 'hatena', 'correct')
     
     Returns:
-        dict: {'created': bool, 'reaction': Reaction or None}
+        dict: {'created': bool}
     """
     if reaction_type not in ["like", "hatena", "correct"]:
         raise ValueError(f"Invalid reaction type: {reaction_type}")
     
-    try:
-        reaction = Reaction.objects.get(user=user, post=post, reaction_type=reaction_type)
-        # 既に存在する場合は削除
-        reaction.delete()
-        
-        # correct_count をデクリメント（F() で原子性確保）
-        if reaction_type == "correct":
-            # max(0, correct_count - 1) の確保
-            post.correct_count = F('correct_count') - 1
-            post.save(update_fields=['correct_count'])
-            post.refresh_from_db()
-            # 念のため 0 未満にならないようにする
-            if post.correct_count < 0:
-                post.correct_count = 0
-                post.save(update_fields=['correct_count'])
-        
-        return {"created": False, "reaction": None}
+    # 保存形式（rows / bitmask）は reactions モジュールが切り替える
+    created = reactions.toggle(user.pk, post.pk, reaction_type)
+    field = REACTION_COUNTER_FIELDS[reaction_type]
     
-    except Reaction.DoesNotExist:
-        # 存在しない場合は新規作成
-        reaction = Reaction.objects.create(
-            user=user,
-            post=post,
-            reaction_type=reaction_type
+    if not created:
+        # カウンタをデクリメント（F() で原子性確保、0 未満にはしない）
+        Post.objects.filter(pk=post.pk).update(**{field: Greatest(F(field) - 1, 0)})
+        user_stats.bump(post.author_id, **{user_stats.RECEIVED_FIELDS[reaction_type]: -1})
+        user_stats.bump(user.pk, reactions_given=-1)
+        record_event(
+            "reaction.removed",
+            user_id=user.pk,
+            post_id=post.pk,
+            author_id=post.author_id,
+            reaction_type=reaction_type,
         )
         
-        # correct_count をインクリメント（F() で原子性確保）
-        if reaction_type == "correct":
-            post.correct_count = F('correct_count') + 1
-            post.save(update_fields=['correct_count'])
-            post.refresh_from_db()
-        
-        # like のみ通知を作成
-        if reaction_type == "like" and user != post.author:
-            Notification.objects.get_or_create(
-                user=post.author,
-                actor=user,
-                notification_type="liked",
-                post=post,
-            )
-        
-        return {"created": True, "reaction": reaction}
+        return {"created": False}
+    
+    # カウンタをインクリメント（F() で原子性確保）
+    Post.objects.filter(pk=post.pk).update(**{field: F(field) + 1})
+    user_stats.bump(post.author_id, **{user_stats.RECEIVED_FIELDS[reaction_type]: 1})
+    user_stats.bump(user.pk, reactions_given=1)
+    record_event(
+        "reaction.added",
+        user_id=user.pk,
+        post_id=post.pk,
+        author_id=post.author_id,
+        reaction_type=reaction_type,
+    )
+    
+    # like のみ通知を作成
+    if reaction_type == "like" and user != post.author:
+        create_notification(
+            user_id=post.author_id,
+            actor_id=user.pk,
+            notification_type="liked",
+            post_id=post.pk,
+        )
+    
+    return {"created": True}
 
 
+@transaction.atomic
 def toggle_follow(follower, following):
     """
     フォロー のトグル（追加/削除）
@@ -81,17 +147,115 @@ def toggle_follow(follower, following):
         follow = Follow.objects.get(follower=follower, following=following)
         # 既に存在する場合は削除
         follow.delete()
+        record_event("follow.removed", follower_id=follower.pk, following_id=following.pk)
+        follow_cache.invalidate(follower.pk)
         return {"created": False, "follow": None}
     
     except Follow.DoesNotExist:
         # 存在しない場合は新規作成
         follow = Follow.objects.create(follower=follower, following=following)
+        record_event("follow.added", follower_id=follower.pk, following_id=following.pk)
+        follow_cache.invalidate(follower.pk)
         
         # followed 通知を作成
-        Notification.objects.get_or_create(
-            user=following,
-            actor=follower,
+        create_notification(
+            user_id=following.pk,
+            actor_id=follower.pk,
             notification_type="followed",
         )
         
         return {"created": True, "follow": follow}
+
+
+def request_account_deletion(user):
+    """
+    退会リクエスト
+
+    ユーザーを即時に無効化してトークンを失効させ、投稿も論理削除して一覧・フィードから外す。
+    依存行の削除は重いのでジョブキュー（または drain_account_deletions）で
+    バックグラウンド実行する
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        User.objects.filter(pk=user.pk).update(
+            is_active=False,
+            deletion_requested_at=now,
+        )
+        Token.objects.filter(user=user).delete()
+        posts = Post.objects.filter(author_id=user.pk, deleted_at__isnull=True)
+        post_ids = list(posts.values_list("id", flat=True))
+        posts.update(deleted_at=now)
+        coalesce.invalidate(*(f"post:{post_id}" for post_id in post_ids))
+        record_event("user.deletion_requested", user_id=user.pk)
+        enqueue("accounts.drain", {"user_id": user.pk})
+
+
+@transaction.atomic
+def create_post(serializer, author):
+    """投稿を作成（イベントも同じトランザクションで記録）"""
+    post = serializer.save(author=author)
+    index_posts([post])
+    user_stats.bump(author.pk, post_count=1)
+    record_event("post.created", post_id=post.pk, author_id=author.pk)
+    return post
+
+
+@transaction.atomic
+def soft_delete_post(post):
+    """投稿を論理削除（イベントも同じトランザクションで記録。受けたリアクション数も集計から外す）"""
+    # 行をロックして、削除時点のカウンタを読む
+    counters = (
+        Post.objects.select_for_update()
+        .filter(pk=post.pk)
+        .values(*REACTION_COUNTER_FIELDS.values())
+        .get()
+    )
+    post.deleted_at = timezone.now()
+    post.save(update_fields=["deleted_at"])
+    user_stats.bump(
+        post.author_id,
+        post_count=-1,
+        **{
+            user_stats.RECEIVED_FIELDS[reaction_type]: -counters[field]
+            for reaction_type, field in REACTION_COUNTER_FIELDS.items()
+        },
+    )
+    coalesce.invalidate(f"post:{post.pk}")
+    record_event("post.deleted", post_id=post.pk, author_id=post.author_id)
+
+
+@transaction.atomic
+def report_post(reporter, post, reason):
+    """
+    投稿を通報
+
+    通報数のカウンタは1回の UPDATE で原子的に更新し、しきい値
+    （REPORT_AUTO_HIDE_THRESHOLD）に達した投稿は同じ UPDATE で非表示にする
+
+    Returns:
+        bool: 新規に通報した場合 True（既に通報済みなら False）
+    """
+    report, created = Report.objects.get_or_create(
+        reporter=reporter,
+        post=post,
+        defaults={"reason": reason},
+    )
+    if not created:
+        return False
+
+    now = timezone.now()
+    updates = {
+        "report_count": F("report_count") + 1,
+        "last_reported_at": now,
+    }
+    threshold = settings.REPORT_AUTO_HIDE_THRESHOLD
+    if threshold:
+        updates["hidden_at"] = Case(
+            When(hidden_at__isnull=True, report_count__gte=threshold - 1, then=Value(now)),
+            default=F("hidden_at"),
+        )
+    Post.objects.filter(pk=post.pk).update(**updates)
+    if threshold:
+        # しきい値に達して非表示になった場合に詳細のキャッシュから消す
+        coalesce.invalidate(f"post:{post.pk}")
+    return True
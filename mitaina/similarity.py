@@ -0,0 +1,128 @@
+"""類似投稿（ほぼ同じ引用）の検出：文字 n-gram の MinHash/LSH"""
+import hashlib
+import random
+import unicodedata
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import Post, PostSimilarityBucket
+
+SHINGLE_SIZE = 3
+NUM_BANDS = 8
+ROWS_PER_BAND = 4
+NUM_PERM = NUM_BANDS * ROWS_PER_BAND
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(20240601)  # 固定シード（バケットは永続化されるので変えないこと）
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERM)
+]
+
+
+def normalize(text):
+    """表記ゆれを吸収（NFKC・小文字化・「みたいな」除去・記号/空白除去）"""
+    t = unicodedata.normalize("NFKC", text or "").lower().strip()
+    if t.endswith("みたいな"):
+        t = t[: -len("みたいな")]
+    return "".join(ch for ch in t if unicodedata.category(ch)[0] in ("L", "N"))
+
+
+def shingles(text):
+    """正規化したテキストの文字 n-gram 集合"""
+    t = normalize(text)
+    if len(t) <= SHINGLE_SIZE:
+        return {t} if t else set()
+    return {t[i : i + SHINGLE_SIZE] for i in range(len(t) - SHINGLE_SIZE + 1)}
+
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def minhash(shingle_set):
+    """MinHash シグネチャ（長さ NUM_PERM）"""
+    hashes = [_hash64(s) % _MERSENNE_PRIME for s in shingle_set]
+    return [
+        min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def lsh_buckets(signature):
+    """シグネチャをバンドに分け、バンドごとのバケット値（符号付き64bit）を返す"""
+    buckets = []
+    for band in range(NUM_BANDS):
+        rows = signature[band * ROWS_PER_BAND : (band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(repr(rows).encode(), digest_size=8).digest()
+        buckets.append((band, int.from_bytes(digest, "big", signed=True)))
+    return buckets
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _bucket_rows(post):
+    shingle_set = shingles(post.text)
+    if not shingle_set:
+        return []
+    return [
+        PostSimilarityBucket(post_id=post.pk, band=band, bucket=bucket)
+        for band, bucket in lsh_buckets(minhash(shingle_set))
+    ]
+
+
+@transaction.atomic
+def index_posts(posts):
+    """投稿のバケットを作り直す"""
+    posts = list(posts)
+    PostSimilarityBucket.objects.filter(post_id__in=[p.pk for p in posts]).delete()
+    rows = []
+    for post in posts:
+        rows.extend(_bucket_rows(post))
+    PostSimilarityBucket.objects.bulk_create(rows)
+
+
+def find_similar(text, exclude_id=None, limit=5, threshold=None, max_candidates=50):
+    """
+    text とほぼ同じ投稿を返す（post.similarity に Jaccard 類似度をセット）
+
+    LSH バケットが1つ以上一致する投稿だけを候補にするので全件は走査しない
+    """
+    threshold = settings.SIMILARITY_THRESHOLD if threshold is None else threshold
+    shingle_set = shingles(text)
+    if not shingle_set:
+        return []
+
+    lookup = Q()
+    for band, bucket in lsh_buckets(minhash(shingle_set)):
+        lookup |= Q(band=band, bucket=bucket)
+    candidates = PostSimilarityBucket.objects.filter(lookup)
+    if exclude_id is not None:
+        candidates = candidates.exclude(post_id=exclude_id)
+    candidate_ids = list(
+        candidates.values("post_id")
+        .annotate(matches=Count("id"))
+        .order_by("-matches")
+        .values_list("post_id", flat=True)[:max_candidates]
+    )
+    if not candidate_ids:
+        return []
+
+    results = []
+    posts = Post.objects.filter(
+        pk__in=candidate_ids,
+        deleted_at__isnull=True,
+        hidden_at__isnull=True,
+    ).select_related("author")
+    for post in posts:
+        post.similarity = round(jaccard(shingle_set, shingles(post.text)), 3)
+        if post.similarity >= threshold:
+            results.append(post)
+    results.sort(key=lambda p: (p.similarity, p.created_at), reverse=True)
+    return results[:limit]
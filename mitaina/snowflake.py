@@ -0,0 +1,185 @@
+"""
+時刻順の ID（Snowflake 風）
+
+フロントエンドは ID を JavaScript の number で扱うため、53 bit に収める:
+
+    | 41 bit: エポックからのミリ秒 | 6 bit: ワーカー ID | 6 bit: シーケンス |
+
+- 41 bit のミリ秒で約69年（2024-01-01 から 2093 年まで）
+- ワーカーごとに 1 ミリ秒あたり 64 個まで（超えたら次のミリ秒まで待つ）
+- 既存の連番 ID より必ず大きいので、有効にした後も ID 順 = 作成順になる
+  （無効に戻すと連番 ID が小さい値に戻るため、一度有効にしたら戻さないこと）
+
+ワーカー ID（0〜63）はプロセスごとに SnowflakeWorker の行を期限つきで借りて決める
+（fork した gunicorn のワーカーやジョブのワーカーも含め、同時に同じ ID を使うことはない）。
+期限の半分が過ぎたら延長し、延長できなければ（期限切れで他のプロセスに
+取られていたら）別の ID を借り直す。期限内の ID だけを使うので、前の持ち主が
+最後に振った ID と重なることはない。書き込むプロセスは全ホストで 64 個まで。
+"""
+import atexit
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+WORKER_BITS = 6
+SEQUENCE_BITS = 6
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+TIMESTAMP_SHIFT = WORKER_BITS + SEQUENCE_BITS
+
+
+def _in_own_connection(func):
+    """
+    func を別スレッド（＝別の DB 接続・autocommit）で実行する
+
+    save() の途中で呼ばれても、貸し出しの記録が呼び出し元のトランザクションと
+    一緒にロールバックされないようにする
+    """
+    result = {}
+
+    def run():
+        try:
+            result["value"] = func()
+        except BaseException as exc:
+            result["error"] = exc
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=run, name="snowflake-lease")
+    thread.start()
+    thread.join()
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
+
+
+def _acquire(owner, seconds):
+    """空いているワーカー ID を借りる"""
+    from .models import SnowflakeWorker
+
+    now = timezone.now()
+    with transaction.atomic():
+        SnowflakeWorker.objects.bulk_create(
+            [SnowflakeWorker(worker_id=i) for i in range(MAX_WORKER_ID + 1)], ignore_conflicts=True
+        )
+        worker = (
+            SnowflakeWorker.objects.select_for_update(skip_locked=True)
+            .filter(Q(expires_at__isnull=True) | Q(expires_at__lt=now))
+            .order_by("expires_at", "worker_id")
+            .first()
+        )
+        if worker is None:
+            raise RuntimeError(f"no free snowflake worker id (all {MAX_WORKER_ID + 1} are leased)")
+        worker.owner = owner
+        worker.expires_at = now + timedelta(seconds=seconds)
+        worker.save(update_fields=["owner", "expires_at"])
+    return worker.worker_id
+
+
+def _renew(worker_id, owner, seconds):
+    """借りている ID の期限を延ばす（もう自分のものでなければ False）"""
+    from .models import SnowflakeWorker
+
+    now = timezone.now()
+    return SnowflakeWorker.objects.filter(
+        worker_id=worker_id, owner=owner, expires_at__gt=now
+    ).update(expires_at=now + timedelta(seconds=seconds)) == 1
+
+
+def _release(worker_id, owner):
+    from .models import SnowflakeWorker
+
+    SnowflakeWorker.objects.filter(worker_id=worker_id, owner=owner).update(owner="", expires_at=None)
+
+
+class SnowflakeGenerator:
+    def __init__(self, lease_seconds=60):
+        self._lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _reset(self):
+        # fork 後（gunicorn の preload など）は親の ID を使わず、子プロセスごとに借りる
+        self._owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._worker_id = None
+        self._renew_at = 0.0
+        self._last_ms = -1
+        self._sequence = 0
+        self._pid = os.getpid()
+
+    def _ensure_lease(self):
+        """期限が半分以上残っている ID を持つ（ID を振る前に毎回確認する）"""
+        if self._worker_id is not None and time.monotonic() < self._renew_at:
+            return
+        if self._worker_id is None or not _in_own_connection(
+            lambda: _renew(self._worker_id, self._owner, self._lease_seconds)
+        ):
+            first = self._worker_id is None
+            self._worker_id = _in_own_connection(lambda: _acquire(self._owner, self._lease_seconds))
+            if first:
+                atexit.register(self.release)
+        self._renew_at = time.monotonic() + self._lease_seconds / 2
+
+    def release(self):
+        """借りている ID を返す（終了時）"""
+        with self._lock:
+            if self._worker_id is not None and self._pid == os.getpid():
+                try:
+                    _in_own_connection(lambda: _release(self._worker_id, self._owner))
+                except Exception:
+                    pass  # 返せなくても期限が切れれば空く
+                self._worker_id = None
+
+    def next_id(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            self._ensure_lease()
+
+            now = int(time.time() * 1000) - EPOCH_MS
+            # 時計が戻った場合は最後の時刻を使い続ける
+            now = max(now, self._last_ms)
+            if now == self._last_ms:
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    # このミリ秒の分を使い切ったので次のミリ秒まで待つ
+                    while now <= self._last_ms:
+                        time.sleep(0.0001)
+                        now = int(time.time() * 1000) - EPOCH_MS
+            else:
+                self._sequence = 0
+            self._last_ms = now
+            return (now << TIMESTAMP_SHIFT) | (self._worker_id << SEQUENCE_BITS) | self._sequence
+
+
+_generator = None
+
+
+def next_id():
+    """新しい ID を返す"""
+    global _generator
+    if _generator is None:
+        _generator = SnowflakeGenerator(settings.SNOWFLAKE_LEASE_SECONDS)
+    return _generator.next_id()
+
+
+def default_ordering():
+    """一覧の既定の並び順（時刻順の ID なら主キーのインデックスだけで並べられる）"""
+    return "-id" if settings.SNOWFLAKE_IDS else "-created_at"
+
+
+def assign_id(instance):
+    """SNOWFLAKE_IDS が有効で、まだ ID がなければ振る（振ったら True）"""
+    if settings.SNOWFLAKE_IDS and instance.pk is None:
+        instance.pk = next_id()
+        return True
+    return False
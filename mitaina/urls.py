@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import views, async_views
 
 # Router でビューセットを登録
 router = DefaultRouter()
@@ -9,7 +9,19 @@ router.register(r"posts", views.PostViewSet, basename="post")
 router.register(r"feed", views.FeedViewSet, basename="feed")
 router.register(r"me/reactions", views.MeReactionsViewSet, basename="me-reactions")
 router.register(r"me/notifications", views.MeNotificationsViewSet, basename="me-notifications")
+router.register(r"moderation/queue", views.ModerationQueueViewSet, basename="moderation-queue")
+router.register(r"export", views.ExportViewSet, basename="export")
+
+# 読み取り専用の非同期エンドポイント（ASGI で動かす）
+async_urlpatterns = [
+    path("posts/", async_views.post_list, name="async-post-list"),
+    path("posts/<int:pk>/", async_views.post_detail, name="async-post-detail"),
+    path("feed/", async_views.feed, name="async-feed"),
+    path("users/<str:username>/", async_views.user_detail, name="async-user-detail"),
+    path("me/notifications/", async_views.notification_list, name="async-notification-list"),
+]
 
 urlpatterns = [
+    path("async/", include(async_urlpatterns)),
     path("", include(router.urls)),
 ]
\ No newline at end of file
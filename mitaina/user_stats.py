@@ -0,0 +1,106 @@
+"""
+ユーザーごとの集計（UserStats）
+
+投稿作成・論理削除・リアクションの付け外し・投稿の物理削除・退会処理で差分だけ更新する。
+行がまだないユーザー（導入前からのユーザーなど）は最初の更新時に集計し直して作る。
+"""
+from django.db import connection
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from .models import Post, Reaction, ReactionSet, User, UserStats
+from .reactions import bitmask_enabled
+
+# リアクションタイプ → UserStats の受けたリアクション数の列
+RECEIVED_FIELDS = {
+    "like": "like_received",
+    "hatena": "hatena_received",
+    "correct": "correct_received",
+    "collect": "collect_received",
+}
+
+STATS_FIELDS = ("post_count", *RECEIVED_FIELDS.values(), "reactions_given")
+
+_GIVEN_ROWS_SQL = """
+SELECT user_id, COUNT(*) AS n FROM {reaction}
+WHERE user_id BETWEEN %s AND %s GROUP BY user_id
+"""
+
+_GIVEN_BITMASK_SQL = """
+SELECT user_id,
+    SUM((mask & 1 <> 0)::int + (mask & 2 <> 0)::int + (mask & 4 <> 0)::int + (mask & 8 <> 0)::int) AS n
+FROM {reactionset}
+WHERE user_id BETWEEN %s AND %s GROUP BY user_id
+"""
+
+_RECONCILE_SQL = """
+INSERT INTO {stats} (user_id, {fields}, updated_at)
+SELECT
+    u.id,
+    COALESCE(p.post_count, 0),
+    COALESCE(p.like_received, 0),
+    COALESCE(p.hatena_received, 0),
+    COALESCE(p.correct_received, 0),
+    COALESCE(p.collect_received, 0),
+    COALESCE(g.n, 0),
+    now()
+FROM {user} AS u
+LEFT JOIN (
+    SELECT
+        author_id,
+        COUNT(*) AS post_count,
+        SUM(like_count) AS like_received,
+        SUM(hatena_count) AS hatena_received,
+        SUM(correct_count) AS correct_received,
+        SUM(collect_count) AS collect_received
+    FROM {post}
+    WHERE deleted_at IS NULL AND author_id BETWEEN %s AND %s
+    GROUP BY author_id
+) AS p ON p.author_id = u.id
+LEFT JOIN ({given}) AS g ON g.user_id = u.id
+WHERE u.id BETWEEN %s AND %s
+ON CONFLICT (user_id) DO UPDATE SET {updates}, updated_at = EXCLUDED.updated_at
+WHERE ({current}) IS DISTINCT FROM ({excluded})
+"""
+
+
+def reconcile(low, high):
+    """
+    ID が low〜high のユーザーの集計を投稿・リアクションから計算し直す
+
+    Returns:
+        int: 作成・修正した行数（一致していた行は更新しない）
+    """
+    tables = {
+        "stats": UserStats._meta.db_table,
+        "user": User._meta.db_table,
+        "post": Post._meta.db_table,
+        "reaction": Reaction._meta.db_table,
+        "reactionset": ReactionSet._meta.db_table,
+    }
+    given = (_GIVEN_BITMASK_SQL if bitmask_enabled() else _GIVEN_ROWS_SQL).format(**tables)
+    sql = _RECONCILE_SQL.format(
+        given=given,
+        fields=", ".join(STATS_FIELDS),
+        updates=", ".join(f"{f} = EXCLUDED.{f}" for f in STATS_FIELDS),
+        current=", ".join(f"{tables['stats']}.{f}" for f in STATS_FIELDS),
+        excluded=", ".join(f"EXCLUDED.{f}" for f in STATS_FIELDS),
+        **tables,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [low, high, low, high, low, high])
+        return cursor.rowcount
+
+
+def bump(user_id, **deltas):
+    """集計を差分で更新する（例: bump(user.pk, post_count=1)。0 未満にはしない）"""
+    updates = {
+        field: F(field) + delta if delta > 0 else Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+        if delta
+    }
+    if not updates:
+        return
+    if not UserStats.objects.filter(user_id=user_id).update(**updates):
+        # 行がなければ今の状態から作る（この変更も反映済み）
+        reconcile(user_id, user_id)
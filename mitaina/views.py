@@ -1,37 +1,304 @@
 """API ビュー"""
+import base64
+import binascii
+import hashlib
+
 from rest_framework import viewsets, status, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny, SAFE_METHODS
 from rest_framework.filters import SearchFilter, OrderingFilter
 from rest_framework.throttling import ScopedRateThrottle
+from rest_framework.settings import api_settings
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q, Count, Exists, OuterRef
+from django.db.models import Q, Count
 from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_str
 
-from .models import User, Post, Reaction, Follow, Notification, Report
+from .models import User, Post, Follow, Notification, FollowRecommendation
 from .serializers import (
     UserPublicSerializer,
     UserDetailSerializer,
     PostSerializer,
+    SimilarPostSerializer,
+    ModerationPostSerializer,
     ReactionToggleSerializer,
     ReactionSerializer,
     ReportSerializer,
     NotificationSerializer,
     FollowSerializer,
+    is_compact,
+    returns_field,
+)
+from .services import (
+    toggle_reaction,
+    toggle_follow,
+    request_account_deletion,
+    create_post,
+    soft_delete_post,
+    report_post,
 )
-from .services import toggle_reaction, toggle_follow
+from .exports import EXPORT_FORMATS, iter_export
+from .similarity import find_similar
+from .follow_cache import following_ids
+from .impressions import record_views, viewer_key
+from . import coalesce
+from .admission import admit
+from .reactions import reacted, reaction_states
+from .snowflake import default_ordering
+from .db_router import (
+    activate_replica,
+    current_read_alias,
+    deactivate_replica,
+    is_pinned_to_primary,
+    pin_to_primary,
+)
+
+
+class ReplicaReadMixin:
+    """安全なメソッドの読み取りをレプリカへ流す（書き込み直後のユーザーは primary に固定）"""
+    _replica_token = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and not (
+            request.user.is_authenticated and is_pinned_to_primary(request.user.pk)
+        ):
+            self._replica_token = activate_replica()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if self._replica_token is not None:
+            deactivate_replica(self._replica_token)
+            self._replica_token = None
+        # 書き込みに成功したら read-your-writes のため primary に固定
+        if (
+            request.method not in SAFE_METHODS
+            and request.user.is_authenticated
+            and response.status_code < 400
+        ):
+            pin_to_primary(request.user.pk)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class AdmissionControlMixin:
+    """
+    一覧のページ取得をコストのクラスに分けて流量制御する（admission）
+
+    - search: ?search=（search_fields があるビューのみ）
+    - sort: indexed_ordering_fields 以外での ?ordering=
+    - deep_page: ADMISSION_DEEP_PAGE より後ろのページ（?page=last を含む）
+
+    ページの取得（件数と OFFSET つきの SELECT）だけを囲むので、キャッシュから
+    返す一覧（CoalescedReadMixin）は枠を使わない。ページングしない取得は
+    admitted() で囲むこと（NewSincePollingMixin の ?since_id= など）
+    """
+    indexed_ordering_fields = ("id",)
+
+    def admission_class(self):
+        params = self.request.query_params
+        if getattr(self, "search_fields", None) and params.get(api_settings.SEARCH_PARAM):
+            return "search"
+        ordering = params.get(api_settings.ORDERING_PARAM)
+        if ordering and any(
+            term.strip().lstrip("-") not in self.indexed_ordering_fields
+            for term in ordering.split(",")
+            if term.strip()
+        ):
+            return "sort"
+        page = params.get("page")
+        if page == "last" or (page and page.isdigit() and int(page) > settings.ADMISSION_DEEP_PAGE):
+            return "deep_page"
+        return None
+
+    def admitted(self):
+        return admit(f"{self.basename}.{self.action}", self.admission_class(), current_read_alias())
+
+    def paginate_queryset(self, queryset):
+        with self.admitted():
+            return super().paginate_queryset(queryset)
+
+
+def side_load_authors(request, response, posts):
+    """?compact=1 のとき、ページ内の投稿者を authors にまとめて返す（投稿側は author の ID のみ）"""
+    # ?fields= で author を返さないなら不要（author_id も .only() で読み込んでいない）
+    if not is_compact(request) or posts is None or not returns_field(request, "author"):
+        return response
+    authors = User.objects.filter(pk__in={post.author_id for post in posts}).only(
+        "id", "username", "handle_name"
+    )
+    response.data["authors"] = {str(author.pk): UserPublicSerializer(author).data for author in authors}
+    return response
+
+
+class SideLoadAuthorsMixin:
+    """投稿一覧で ?compact=1 のとき投稿者を authors にまとめる"""
+    _page = None
+
+    def paginate_queryset(self, queryset):
+        self._page = super().paginate_queryset(queryset)
+        return self._page
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        return side_load_authors(self.request, response, self._page)
+
+
+class ViewTrackingMixin:
+    """投稿の詳細表示と一覧のページに出た投稿を閲覧として記録する（impressions）"""
+    _viewed_ids = None
+
+    def get_object(self):
+        obj = super().get_object()
+        if self.action == "retrieve":
+            self._viewed_ids = [obj.pk]
+        return obj
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None and self.action == "list":
+            self._viewed_ids = [post.pk for post in page]
+        return page
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if self._viewed_ids and response.status_code == 200:
+            record_views(self._viewed_ids, viewer_key(request, request.user))
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class CoalescedReadMixin:
+    """
+    一覧・詳細の GET をキャッシュし、同時のキャッシュミスを1回の計算に合流させる（coalesce）
+
+    レスポンスは閲覧者によらない前提。書き込み直後で primary に固定中のユーザー
+    （ReplicaReadMixin がレプリカを使わない場合）と、?since_id= / ?since_cursor= の
+    新着ポーリング（has_new はキャッシュしないので結果が食い違う）はキャッシュを使わない
+    """
+
+    def _read_cache_key(self, request):
+        uri = hashlib.sha1(request.build_absolute_uri().encode()).hexdigest()
+        if self.action == "retrieve":
+            # 削除・非表示はバージョンを切り替えて即時に反映する
+            name = f"post:{self.kwargs[self.lookup_url_kwarg or self.lookup_field]}"
+            return f"coalesce:{self.basename}:retrieve:{coalesce.version(name)}:{uri}"
+        return f"coalesce:{self.basename}:{self.action}:{uri}"
+
+    def _coalesced(self, request, respond):
+        if not settings.READ_CACHE_SECONDS or self._replica_token is None:
+            return respond()
+        if "since_id" in request.query_params or "since_cursor" in request.query_params:
+            return respond()
+
+        def compute():
+            response = respond()
+            return {"status": response.status_code, "data": response.data, "viewed_ids": self._viewed_ids}
+
+        result = coalesce.get_or_compute(
+            self._read_cache_key(request), compute, cacheable=lambda result: result["status"] == 200
+        )
+        # 合流した・キャッシュから返した場合も閲覧は記録する（ViewTrackingMixin）
+        self._viewed_ids = result["viewed_ids"]
+        return Response(result["data"], status=result["status"])
+
+    def list(self, request, *args, **kwargs):
+        return self._coalesced(request, lambda: super(CoalescedReadMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._coalesced(request, lambda: super(CoalescedReadMixin, self).retrieve(request, *args, **kwargs))
+
+
+def encode_post_cursor(post):
+    """投稿の (created_at, id) を since_cursor 用の文字列にする"""
+    raw = f"{post.created_at.isoformat()}|{post.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_post_cursor(cursor):
+    """since_cursor を (created_at, id) に戻す（不正なら ValidationError）"""
+    try:
+        created_at, _, post_id = force_str(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))).rpartition("|")
+        created_at, post_id = parse_datetime(created_at), int(post_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        created_at = None
+    if created_at is None:
+        raise serializers.ValidationError({"since_cursor": "Invalid cursor."})
+    return created_at, post_id
+
+
+class NewSincePollingMixin:
+    """
+    新着だけを取得するポーリング用（投稿一覧・フィード）
+
+    - 一覧に ?since_id=<id> または ?since_cursor=<cursor> を付けると、それより
+      新しい投稿だけを新しい順に最大 1 ページ分返す（件数は数えない）。
+      has_more が true なら 1 ページ目から取り直すこと
+    - has_new/?since_id=... は新着の有無だけを返す（EXISTS 1回。HEAD なら
+      X-Has-New ヘッダーのみ）
+
+    ページングしないので、AdmissionControlMixin と一緒に使って admitted() で囲む
+    """
+
+    def _since_filter(self, request):
+        since_id = request.query_params.get("since_id")
+        since_cursor = request.query_params.get("since_cursor")
+        if since_cursor:
+            created_at, post_id = decode_post_cursor(since_cursor)
+            return Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=post_id)
+        if since_id:
+            try:
+                return Q(id__gt=int(since_id))
+            except ValueError:
+                raise serializers.ValidationError({"since_id": "A valid integer is required."})
+        return None
+
+    def list(self, request, *args, **kwargs):
+        since = self._since_filter(request)
+        if since is None:
+            return super().list(request, *args, **kwargs)
+
+        limit = self.paginator.page_size
+        queryset = self.filter_queryset(self.get_queryset()).filter(since).order_by("-created_at", "-id")
+        with self.admitted():
+            posts = list(queryset[: limit + 1])
+        has_more = len(posts) > limit
+        posts = posts[:limit]
+
+        serializer = self.get_serializer(posts, many=True)
+        response = Response({
+            "results": serializer.data,
+            "has_more": has_more,
+            # 次回のポーリングに使う（新着がなければ受け取ったものをそのまま返す）
+            "cursor": encode_post_cursor(posts[0]) if posts else request.query_params.get("since_cursor"),
+        })
+        return side_load_authors(request, response, posts)
+
+    @action(detail=False, methods=["get", "head"], url_path="has_new")
+    def has_new(self, request):
+        """新着があるか（?since_id= または ?since_cursor= が必須）"""
+        since = self._since_filter(request)
+        if since is None:
+            return Response(
+                {"detail": "since_id or since_cursor is required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        with self.admitted():
+            has_new = self.filter_queryset(self.get_queryset()).filter(since).order_by().exists()
+        return Response({"has_new": has_new}, headers={"X-Has-New": "1" if has_new else "0"})
 
 
-class UserViewSet(viewsets.ReadOnlyModelViewSet):
+class UserViewSet(ReplicaReadMixin, AdmissionControlMixin, viewsets.ReadOnlyModelViewSet):
     """ユーザービューセット（読み取り専用）"""
     serializer_class = UserPublicSerializer
     permission_classes = [AllowAny]
     lookup_field = "username"
+    indexed_ordering_fields = ("id", "username")
 
     def get_queryset(self):
-        """フォロー/フォロワー数とis_followedを含むクエリセット"""
-        qs = User.objects.all()
+        """フォロー/フォロワー数と集計（stats）を含むクエリセット（is_followed はシリアライザーで判定）"""
+        # 退会処理中（無効化済み）のユーザーは表示しない
+        qs = User.objects.filter(is_active=True).select_related("stats")
         
         # フォロー数とフォロワー数をannotate
         qs = qs.annotate(
@@ -39,25 +306,23 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
             followers_count=Count("followers_list", distinct=True),
         )
         
-        # ログイン中ならis_followedも追加
-        if self.request.user.is_authenticated:
-            qs = qs.annotate(
-                is_followed=Exists(
-                    Follow.objects.filter(
-                        follower=self.request.user,
-                        following=OuterRef("pk")
-                    )
-                )
-            )
-        else:
-            # 未ログインの場合はFalseで統一
-            qs = qs.annotate(is_followed=Count("id", filter=Q(id__isnull=True)))
-        
         return qs
 
-    @action(detail=False, methods=["get", "patch"], permission_classes=[IsAuthenticated])
+    def get_serializer_context(self):
+        """ログイン中ならフォロー先 ID（キャッシュ）を渡して is_followed を判定させる"""
+        context = super().get_serializer_context()
+        if self.request.user.is_authenticated:
+            context["following_ids"] = following_ids(self.request.user.pk)
+        return context
+
+    @action(detail=False, methods=["get", "patch", "delete"], permission_classes=[IsAuthenticated])
     def me(self, request):
-        """自分の情報を取得/更新"""
+        """自分の情報を取得/更新/退会"""
+        if request.method == "DELETE":
+            # 即時に無効化し、データの削除はバックグラウンドで行う
+            request_account_deletion(request.user)
+            return Response({"detail": "退会を受け付けました。"}, status=status.HTTP_202_ACCEPTED)
+
         # get_querysetを使ってannotateされたユーザーを取得
         queryset = self.get_queryset()
         user = queryset.get(pk=request.user.pk)
@@ -103,35 +368,59 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+    @action(detail=False, methods=["get"], permission_classes=[IsAuthenticated])
+    def recommendations(self, request):
+        """おすすめユーザー一覧（事前計算した候補から、まだフォローしていない人）"""
+        candidate_ids = list(
+            FollowRecommendation.objects.filter(user=request.user)
+            .order_by("-score")
+            .values_list("candidate_id", flat=True)[:settings.RECOMMENDATION_LIMIT]
+        )
+        following = following_ids(request.user.pk)
+        users = self.get_queryset().filter(pk__in=[pk for pk in candidate_ids if pk not in following])
+        # スコア順に並べ直す
+        order = {user_id: i for i, user_id in enumerate(candidate_ids)}
+        users = sorted(users, key=lambda u: order[u.pk])
+        serializer = UserPublicSerializer(users, many=True, context=self.get_serializer_context())
+        return Response(serializer.data)
+
     @action(detail=True, methods=["get"], permission_classes=[AllowAny])
     def followers(self, request, username=None):
         """フォロワー一覧"""
         user = self.get_object()
-        followers = Follow.objects.filter(following=user).select_related("follower")
-        serializer = FollowSerializer(followers, many=True)
+        context = self.get_serializer_context()
+        followers = Follow.objects.filter(following=user).select_related("follower", "following")
+        followers = FollowSerializer(context=context).trim_queryset(followers)
+        serializer = FollowSerializer(followers, many=True, context=context)
         return Response(serializer.data)
 
     @action(detail=True, methods=["get"], permission_classes=[AllowAny])
     def following(self, request, username=None):
         """フォロー中のユーザー一覧"""
         user = self.get_object()
-        following = Follow.objects.filter(follower=user).select_related("following")
-        serializer = FollowSerializer(following, many=True)
+        context = self.get_serializer_context()
+        following = Follow.objects.filter(follower=user).select_related("follower", "following")
+        following = FollowSerializer(context=context).trim_queryset(following)
+        serializer = FollowSerializer(following, many=True, context=context)
         return Response(serializer.data)
 
     @action(detail=True, methods=["get"], permission_classes=[AllowAny])
     def posts(self, request, username=None):
         """ユーザーの投稿一覧"""
         user = self.get_object()
-        posts = Post.objects.filter(author=user, deleted_at__isnull=True).order_by("-created_at")
+        context = self.get_serializer_context()
+        posts = Post.objects.filter(
+            author=user, deleted_at__isnull=True, hidden_at__isnull=True
+        ).select_related("author").order_by("-created_at")
+        posts = PostSerializer(context=context).trim_queryset(posts)
         
         # ページネーション適用
         page = self.paginate_queryset(posts)
         if page is not None:
-            serializer = PostSerializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+            serializer = PostSerializer(page, many=True, context=context)
+            return side_load_authors(request, self.get_paginated_response(serializer.data), page)
         
-        serializer = PostSerializer(posts, many=True)
+        serializer = PostSerializer(posts, many=True, context=context)
         return Response(serializer.data)
 
     @action(detail=True, methods=["get"], permission_classes=[AllowAny])
@@ -154,30 +443,38 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
         
-        # Reaction を基準にフィルタ（論理削除を除外）
-        reactions = Reaction.objects.filter(
-            user=user,
-            reaction_type=reaction_type,
-            post__deleted_at__isnull=True  # 論理削除を除外
-        ).order_by("-created_at").select_related("post", "post__author")
+        # Reaction（bitmask 形式なら ReactionSet）を基準にフィルタ（論理削除を除外）
+        reactions = reacted(user, reaction_type).filter(
+            post__deleted_at__isnull=True,  # 論理削除を除外
+            post__hidden_at__isnull=True,
+        ).select_related("post", "post__author")
         
         # ページネーション（Reaction を基準）
+        context = self.get_serializer_context()
         page = self.paginate_queryset(reactions)
         if page is not None:
             # リアクションのページから投稿を抽出
             posts = [r.post for r in page]
-            serializer = PostSerializer(posts, many=True)
-            return self.get_paginated_response(serializer.data)
+            serializer = PostSerializer(posts, many=True, context=context)
+            return side_load_authors(request, self.get_paginated_response(serializer.data), posts)
         
         # ページングなしの場合
         posts = [r.post for r in reactions]
-        serializer = PostSerializer(posts, many=True)
+        serializer = PostSerializer(posts, many=True, context=context)
         return Response(serializer.data)
 
 
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(
+    ReplicaReadMixin,
+    AdmissionControlMixin,
+    ViewTrackingMixin,
+    CoalescedReadMixin,
+    NewSincePollingMixin,
+    SideLoadAuthorsMixin,
+    viewsets.ModelViewSet,
+):
     """投稿ビューセット"""
-    queryset = Post.objects.filter(deleted_at__isnull=True)
+    queryset = Post.objects.filter(deleted_at__isnull=True, hidden_at__isnull=True)
     serializer_class = PostSerializer
     permission_classes = [AllowAny]
     throttle_classes = [ScopedRateThrottle]
@@ -185,7 +482,20 @@ class PostViewSet(viewsets.ModelViewSet):
     filterset_fields = ["genre"]
     search_fields = ["text", "work_title", "performer_name"]
     ordering_fields = ["created_at", "like_count", "hatena_count", "correct_count"]
-    ordering = ["-created_at"]
+    # 検索・絞り込みのない一覧だけ件数を推定する（EstimatedCountPageNumberPagination）
+    estimated_count = True
+    indexed_ordering_fields = ("id", "created_at")
+
+    @property
+    def ordering(self):
+        return [default_ordering()]
+
+    def get_queryset(self):
+        """一覧/詳細では ?fields= に合わせてカラムを絞る"""
+        qs = super().get_queryset().select_related("author")
+        if self.action in ("list", "retrieve"):
+            qs = self.get_serializer().trim_queryset(qs)
+        return qs
 
     def get_permissions(self):
         """アクションごとに権限を設定"""
@@ -203,15 +513,20 @@ class PostViewSet(viewsets.ModelViewSet):
             self.throttle_scope = "report"
         return super().get_throttles()
 
+    def create(self, request, *args, **kwargs):
+        """投稿作成（重複の可能性がある投稿も返す）"""
+        response = super().create(request, *args, **kwargs)
+        similar = find_similar(response.data["text"], exclude_id=response.data["id"])
+        response.data["similar_posts"] = SimilarPostSerializer(similar, many=True).data
+        return response
+
     def perform_create(self, serializer):
         """投稿作成時に著者を設定"""
-        serializer.save(author=self.request.user)
+        create_post(serializer, self.request.user)
 
     def perform_destroy(self, instance):
         """投稿削除時に論理削除"""
-        from django.utils import timezone
-        instance.deleted_at = timezone.now()
-        instance.save()
+        soft_delete_post(instance)
 
     @action(detail=True, methods=["post"], permission_classes=[IsAuthenticated])
     def react(self, request, pk=None):
@@ -245,6 +560,14 @@ class PostViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+    @action(detail=True, methods=["get"], permission_classes=[AllowAny])
+    def similar(self, request, pk=None):
+        """ほぼ同じ引用の投稿一覧"""
+        post = self.get_object()
+        similar = find_similar(post.text, exclude_id=post.pk, limit=20)
+        serializer = SimilarPostSerializer(similar, many=True)
+        return Response(serializer.data)
+
     @action(detail=True, methods=["post"], permission_classes=[IsAuthenticated])
     def report(self, request, pk=None):
         """投稿を通報"""
@@ -264,11 +587,7 @@ class PostViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            report, created = Report.objects.get_or_create(
-                reporter=request.user,
-                post=post,
-                defaults={"reason": reason}
-            )
+            created = report_post(request.user, post, reason)
             
             if not created:
                 return Response(
@@ -287,21 +606,35 @@ class PostViewSet(viewsets.ModelViewSet):
             )
 
 
-class FeedViewSet(viewsets.ReadOnlyModelViewSet):
+class FeedViewSet(
+    ReplicaReadMixin,
+    AdmissionControlMixin,
+    ViewTrackingMixin,
+    NewSincePollingMixin,
+    SideLoadAuthorsMixin,
+    viewsets.ReadOnlyModelViewSet,
+):
     """フィード ビューセット（フォロー中のユーザーの投稿）"""
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [OrderingFilter]
-    ordering = ["-created_at"]
+    indexed_ordering_fields = ("id", "created_at")
+
+    @property
+    def ordering(self):
+        return [default_ordering()]
 
     def get_queryset(self):
         """フォロー中のユーザーの投稿を取得"""
-        user = self.request.user
-        following_users = Follow.objects.filter(follower=user).values_list("following", flat=True)
-        return Post.objects.filter(
-            author_id__in=following_users,
-            deleted_at__isnull=True
+        following = following_ids(self.request.user.pk)
+        if not following:
+            return Post.objects.none()
+        qs = Post.objects.filter(
+            author_id__in=list(following),
+            deleted_at__isnull=True,
+            hidden_at__isnull=True,
         ).select_related("author")
+        return self.get_serializer().trim_queryset(qs)
 
 
 class MeReactionsViewSet(viewsets.ViewSet):
@@ -326,54 +659,176 @@ class MeReactionsViewSet(viewsets.ViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
         
-        # Reaction を基準にフィルタ（論理削除を除外）
-        reactions = Reaction.objects.filter(
-            user=request.user,
-            reaction_type=reaction_type,
-            post__deleted_at__isnull=True
-        ).order_by("-created_at").select_related("post", "post__author")
+        # Reaction（bitmask 形式なら ReactionSet）を基準にフィルタ（論理削除を除外）
+        reactions = reacted(request.user, reaction_type).filter(
+            post__deleted_at__isnull=True,
+            post__hidden_at__isnull=True,
+        ).select_related("post", "post__author")
         
         # ページネーション（Reaction を基準）
-        from rest_framework.pagination import PageNumberPagination
-        paginator = PageNumberPagination()
+        from .pagination import EstimatedCountPageNumberPagination
+        paginator = EstimatedCountPageNumberPagination()
+        context = {"request": request, "view": self}
         page = paginator.paginate_queryset(reactions, request)
         if page is not None:
             # リアクションのページから投稿を抽出
             posts = [r.post for r in page]
-            serializer = PostSerializer(posts, many=True)
-            return paginator.get_paginated_response(serializer.data)
+            serializer = PostSerializer(posts, many=True, context=context)
+            return side_load_authors(request, paginator.get_paginated_response(serializer.data), posts)
         
         # ページングなしの場合
         posts = [r.post for r in reactions]
-        serializer = PostSerializer(posts, many=True)
+        serializer = PostSerializer(posts, many=True, context=context)
         return Response(serializer.data)
 
+    @action(detail=False, methods=["get"])
+    def states(self, request):
+        """表示中の投稿に自分が付けているリアクション（?post_ids=1,2,3 → {"1": ["like"], ...}）"""
+        try:
+            post_ids = [int(v) for v in request.query_params.get("post_ids", "").split(",") if v.strip()]
+        except ValueError:
+            return Response({"detail": "post_ids must be comma-separated integers"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(post_ids) > 100:
+            return Response({"detail": "Up to 100 post_ids"}, status=status.HTTP_400_BAD_REQUEST)
+        states = reaction_states(request.user.pk, post_ids) if post_ids else {}
+        return Response({str(post_id): types for post_id, types in states.items()})
+
 
-class MeNotificationsViewSet(viewsets.ReadOnlyModelViewSet):
+class MeNotificationsViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     """自分の通知 ビューセット"""
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
+    MARK_READ_MAX_IDS = 500
 
     def get_queryset(self):
         """自分への通知を取得"""
-        return Notification.objects.filter(user=self.request.user).select_related("actor", "post")
+        qs = Notification.objects.filter(user=self.request.user).select_related(
+            "actor", "post", "post__author"
+        )
+        if self.action in ("list", "retrieve"):
+            qs = self.get_serializer().trim_queryset(qs)
+        return qs
 
     @action(detail=True, methods=["patch"])
     def mark_as_read(self, request, pk=None):
-        """通知を既読にマーク"""
+        """通知を既読にマーク（is_read だけを UPDATE）"""
         notification = self.get_object()
-        notification.is_read = True
-        notification.save()
+        if not notification.is_read:
+            Notification.objects.filter(pk=notification.pk, user=request.user).update(is_read=True)
+            notification.is_read = True
         serializer = self.get_serializer(notification)
         return Response(serializer.data)
 
+    @action(detail=False, methods=["patch"])
+    def mark_read(self, request):
+        """
+        まとめて既読にマーク（1回の UPDATE）
+
+        {"ids": [...]}（最大 MARK_READ_MAX_IDS 件）または {"up_to_id": n}（ID が n 以下のすべて）
+        """
+        ids = request.data.get("ids")
+        up_to_id = request.data.get("up_to_id")
+        if (ids is None) == (up_to_id is None):
+            return Response({"detail": "Specify either ids or up_to_id"}, status=status.HTTP_400_BAD_REQUEST)
+
+        qs = Notification.objects.filter(user=request.user, is_read=False)
+        try:
+            if ids is not None:
+                if not isinstance(ids, list):
+                    raise ValueError
+                if len(ids) > self.MARK_READ_MAX_IDS:
+                    return Response(
+                        {"detail": f"Up to {self.MARK_READ_MAX_IDS} ids"}, status=status.HTTP_400_BAD_REQUEST
+                    )
+                qs = qs.filter(pk__in=[int(i) for i in ids])
+            else:
+                qs = qs.filter(pk__lte=int(up_to_id))
+        except (TypeError, ValueError):
+            return Response({"detail": "ids must be a list of integers and up_to_id an integer"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response({"updated": qs.update(is_read=True)})
+
     @action(detail=False, methods=["patch"])
     def mark_all_as_read(self, request):
         """すべての通知を既読にマーク"""
-        self.get_queryset().update(is_read=True)
+        Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
         return Response({"detail": "すべての通知を既読にしました。"})
 
 
+class ModerationQueueViewSet(viewsets.ReadOnlyModelViewSet):
+    """モデレーションキュー ビューセット（スタッフのみ）"""
+    serializer_class = ModerationPostSerializer
+    permission_classes = [IsAdminUser]
+
+    def get_queryset(self):
+        """通報のある投稿を通報数・最終通報日時の降順で（post_moderation_queue_idx を使う）"""
+        return (
+            Post.objects.filter(report_count__gt=0, deleted_at__isnull=True)
+            .order_by("-report_count", "-last_reported_at")
+            .select_related("author")
+        )
+
+    @action(detail=True, methods=["post"])
+    def dismiss(self, request, pk=None):
+        """問題なしとしてキューから外す（非表示も解除）"""
+        post = self.get_object()
+        Post.objects.filter(pk=post.pk).update(report_count=0, hidden_at=None)
+        coalesce.invalidate(f"post:{post.pk}")
+        return Response({"detail": "通報を却下しました。"})
+
+    @action(detail=True, methods=["post"])
+    def remove(self, request, pk=None):
+        """投稿を削除（論理削除）"""
+        post = self.get_object()
+        soft_delete_post(post)
+        return Response({"detail": "投稿を削除しました。"})
+
+
+class ExportViewSet(viewsets.ViewSet):
+    """一括エクスポート ビューセット（スタッフのみ）"""
+    permission_classes = [IsAdminUser]
+
+    def _stream(self, request, kind):
+        """?output=ndjson|csv&since=<ISO8601>&gzip=1 でストリーミング出力"""
+        # ?format= は DRF のレンダラー指定と衝突するので output を使う
+        fmt = request.query_params.get("output", "ndjson")
+        if fmt not in EXPORT_FORMATS:
+            return Response(
+                {"detail": f"Invalid output. Choose from: {', '.join(EXPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        since = None
+        if request.query_params.get("since"):
+            since = parse_datetime(request.query_params["since"])
+            if since is None:
+                return Response(
+                    {"detail": "since must be an ISO 8601 datetime"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        compress = request.query_params.get("gzip") == "1"
+        content_type = "application/x-ndjson" if fmt == "ndjson" else "text/csv; charset=utf-8"
+        filename = f"{kind}.{fmt}" + (".gz" if compress else "")
+
+        response = StreamingHttpResponse(
+            iter_export(kind, fmt, since=since, compress=compress),
+            content_type="application/gzip" if compress else content_type,
+        )
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+    @action(detail=False, methods=["get"])
+    def posts(self, request):
+        """投稿（リアクション数つき）をエクスポート"""
+        return self._stream(request, "posts")
+
+    @action(detail=False, methods=["get"])
+    def reactions(self, request):
+        """リアクションをエクスポート"""
+        return self._stream(request, "reactions")
+
+
 # パスワードリセット用リダイレクトビュー（A案）
 def password_reset_redirect(request, uidb64, token):
     """
@@ -0,0 +1,123 @@
+"""
+起動直後のウォームアップ
+
+デプロイや再起動の直後は、各ワーカーの最初のリクエストが
+URL の解決表の構築・ビュー/シリアライザーのフィールド構築・DB 接続（SSL ハンドシェイク）
+などをまとめて払うので遅い。これらをリクエストを受ける前に済ませておく。
+
+- code: URL パターンの解決表とシリアライザーのフィールドを作る（DB を使わないので
+  gunicorn の preload ではマスターで1回だけ行い、fork したワーカーに引き継ぐ）
+- database: 全 DB エイリアスに接続して SELECT 1 で確認する（接続は fork をまたいで
+  共有できないので、ワーカーごとに post_fork で行う）
+- queries: 投稿一覧など代表的なクエリを1回流す（WARMUP_QUERIES）
+
+失敗しても起動は止めない（ログに残して続ける）。
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.urls import URLPattern, URLResolver, get_resolver
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def _callbacks(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from _callbacks(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern):
+            yield pattern.callback
+
+
+def _serializer_classes():
+    """URL に登録された DRF ビューの serializer_class（重複なし）"""
+    seen = []
+    for callback in _callbacks(get_resolver().url_patterns):
+        serializer_class = getattr(getattr(callback, "cls", None), "serializer_class", None)
+        if (
+            isinstance(serializer_class, type)
+            and issubclass(serializer_class, BaseSerializer)
+            and serializer_class not in seen
+        ):
+            seen.append(serializer_class)
+    return seen
+
+
+def load_code():
+    """URL の解決表とシリアライザーのフィールドを作っておく"""
+    resolver = get_resolver()
+    resolver.reverse_dict  # 解決表（reverse 用）を構築させる
+
+    for serializer_class in _serializer_classes():
+        try:
+            serializer_class(context={}).fields
+        except Exception:
+            logger.warning("warm-up: could not build %s", serializer_class.__name__, exc_info=True)
+
+
+def connect_databases():
+    """全 DB エイリアスに接続して確認する"""
+    for alias in connections:
+        connection = connections[alias]
+        connection.ensure_connection()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+
+
+def run_queries():
+    """代表的な読み取り（投稿一覧の1ページ目・件数の推定・ユーザー）を1回ずつ流す"""
+    from .db_router import activate_replica, deactivate_replica
+    from .models import Post, User
+    from .pagination import estimated_count
+    from .serializers import PostSerializer, UserPublicSerializer
+    from .snowflake import default_ordering
+
+    token = activate_replica()
+    try:
+        posts = (
+            Post.objects.filter(deleted_at__isnull=True, hidden_at__isnull=True)
+            .select_related("author")
+            .order_by(default_ordering())
+        )
+        PostSerializer(list(posts[: settings.REST_FRAMEWORK["PAGE_SIZE"]]), many=True).data
+        estimated_count(posts, estimate=True)
+        user = User.objects.filter(is_active=True).select_related("stats").first()
+        if user is not None:
+            UserPublicSerializer(user).data
+    finally:
+        deactivate_replica(token)
+
+
+def warm_up(code=True, database=True, queries=False):
+    """
+    ウォームアップを行い、[(ステップ名, 秒)] を返す（失敗したステップは秒の代わりに None）
+    """
+    steps = []
+    if code:
+        steps.append(("code", load_code))
+    if database:
+        steps.append(("database", connect_databases))
+    if queries:
+        steps.append(("queries", run_queries))
+
+    timings = []
+    for name, func in steps:
+        started = time.perf_counter()
+        try:
+            func()
+        except Exception:
+            logger.exception("warm-up step %s failed", name)
+            timings.append((name, None))
+        else:
+            timings.append((name, time.perf_counter() - started))
+    return timings
+
+
+def format_timings(timings):
+    return ", ".join(
+        f"{name}={seconds * 1000:.1f}ms" if seconds is not None else f"{name}=failed"
+        for name, seconds in timings
+    )